@@ -0,0 +1,37 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from Clients.repo_pool import default_pool
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="git-fetch")
+_in_flight: Dict[str, Future] = {}
+_lock = threading.Lock()
+
+# Called with the repository path after each successful update, e.g. to refresh derived indexes
+update_hooks: List[Callable[[str], None]] = []
+
+
+def _update(path: str) -> List:
+    try:
+        with default_pool.client(path) as client:
+            updated = client.update()
+        for hook in update_hooks:
+            hook(path)
+        return updated
+    finally:
+        with _lock:
+            _in_flight.pop(path, None)
+
+
+def fetch_in_background(repo_path: str) -> Future:
+    """
+    Schedules `ReadOnlyGitClient.update` on a background thread.
+    Only one update per repository runs at a time, a second call returns the pending future.
+    """
+    path = os.path.realpath(repo_path)
+    with _lock:
+        if path not in _in_flight:
+            _in_flight[path] = _executor.submit(_update, path)
+        return _in_flight[path]
@@ -0,0 +1,247 @@
+import os
+import sqlite3
+import subprocess
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
+
+from git import Repo
+
+from Clients.path_index import is_partial_clone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    sha TEXT PRIMARY KEY,
+    author_name TEXT,
+    author_email TEXT,
+    authored_at INTEGER,
+    committer_name TEXT,
+    committed_at INTEGER,
+    parents TEXT,
+    message TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    sha TEXT,
+    path TEXT,
+    added INTEGER,
+    removed INTEGER
+);
+CREATE TABLE IF NOT EXISTS indexed_tips (sha TEXT PRIMARY KEY);
+CREATE INDEX IF NOT EXISTS commits_authored_at ON commits (authored_at);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+CREATE INDEX IF NOT EXISTS files_sha ON files (sha);
+"""
+
+# git log record: fields separated by \x1f, records starting with \x1e, file stats after the last field
+LOG_FORMAT = "%x1e%H%x1f%an%x1f%ae%x1f%at%x1f%cn%x1f%ct%x1f%P%x1f%B%x1f"
+INSERT_BATCH = 500
+
+
+class CommitIndex:
+    """
+    SQLite index of commit metadata and touched files, stored in <git dir>/agent-cache/commits.sqlite.
+    update() only walks the commits that are not reachable from the tips indexed last time.
+    """
+
+    def __init__(self, repo: Repo, db_path: str = None):
+        self.repo = repo
+        self.db_path = db_path or os.path.join(repo.git_dir, "agent-cache", "commits.sqlite")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _tips(self) -> List[str]:
+        output = self.repo.git.for_each_ref("--format=%(objectname)", "refs/heads", "refs/remotes", "refs/tags")
+        tips = set(output.split())
+        tips.add(self.repo.head.commit.hexsha)
+        return sorted(tips)
+
+    def _log(self, tips: List[str], known: List[str]) -> Iterator[Dict]:
+        """Streams the commits reachable from tips but not from known, with their touched files."""
+        # Partial clones only have trees locally, line counts would fetch every blob
+        stats = "--name-only" if is_partial_clone(self.repo) else "--numstat"
+        process = subprocess.Popen(
+            ["git", f"--git-dir={self.repo.git_dir}", "log", "--stdin", "--no-renames", stats, f"--format={LOG_FORMAT}"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        process.stdin.write("\n".join(tips + [f"^{sha}" for sha in known]).encode() + b"\n")
+        process.stdin.close()
+
+        buffer = b""
+        try:
+            while True:
+                chunk = process.stdout.read(1 << 16)
+                buffer += chunk
+                records = buffer.split(b"\x1e")
+                buffer = records.pop() if chunk else b""
+                for record in records:
+                    if record:
+                        yield self._parse(record.decode("utf-8", errors="replace"), stats == "--numstat")
+                if not chunk:
+                    break
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    @staticmethod
+    def _parse(record: str, numstat: bool) -> Dict:
+        sha, author_name, author_email, authored_at, committer_name, committed_at, parents, message, stats \
+            = record.split("\x1f")
+        files = []
+        for line in stats.strip("\n").splitlines():
+            if not line:
+                continue
+            if numstat:
+                added, removed, path = line.split("\t", 2)
+                files.append((sha, path, None if added == "-" else int(added), None if removed == "-" else int(removed)))
+            else:
+                files.append((sha, line, None, None))
+        return {
+            "commit": (sha, author_name, author_email, int(authored_at), committer_name, int(committed_at),
+                       parents, message.strip()),
+            "files": files,
+        }
+
+    def update(self) -> int:
+        """
+        Indexes the commits added since the last update. Returns the number of new commits.
+        """
+        with self._lock:
+            tips = self._tips()
+            known = [row[0] for row in self.conn.execute("SELECT sha FROM indexed_tips")]
+            if set(tips) <= set(known):
+                return 0
+
+            count, commits, files = 0, [], []
+            for entry in self._log(tips, known):
+                commits.append(entry["commit"])
+                files += entry["files"]
+                if len(commits) >= INSERT_BATCH:
+                    count += self._insert(commits, files)
+                    commits, files = [], []
+            count += self._insert(commits, files)
+
+            with self.conn:
+                self.conn.execute("DELETE FROM indexed_tips")
+                self.conn.executemany("INSERT INTO indexed_tips (sha) VALUES (?)", [(sha,) for sha in tips])
+            return count
+
+    def _insert(self, commits: List[tuple], files: List[tuple]) -> int:
+        with self.conn:
+            inserted = self.conn.executemany("INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                             commits).rowcount
+            new_shas = {commit[0] for commit in commits}
+            self.conn.execute("DELETE FROM files WHERE sha IN (%s)" % ",".join("?" * len(new_shas)), list(new_shas))
+            self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", files)
+        return inserted
+
+    @staticmethod
+    def _timestamp(date: str) -> int:
+        """ISO date or datetime to a UTC timestamp."""
+        parsed = datetime.fromisoformat(date)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+
+    def _where(self, author: str = None, since: str = None, until: str = None, path: str = None,
+               text: str = None) -> tuple:
+        clauses, params = [], []
+        if author:
+            clauses.append("(c.author_name LIKE ? OR c.author_email LIKE ?)")
+            params += [f"%{author}%", f"%{author}%"]
+        if since:
+            clauses.append("c.authored_at >= ?")
+            params.append(self._timestamp(since))
+        if until:
+            clauses.append("c.authored_at < ?")
+            params.append(self._timestamp(until))
+        if path:
+            clauses.append("c.sha IN (SELECT sha FROM files WHERE path = ? OR path LIKE ?)")
+            params += [path.strip("/"), path.strip("/") + "/%"]
+        if text:
+            clauses.append("c.message LIKE ?")
+            params.append(f"%{text}%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, author: str = None, since: str = None, until: str = None, path: str = None,
+              text: str = None, limit: int = 50) -> List[Dict]:
+        """
+        Commits filtered by author (name or e-mail substring), date range (ISO dates, until excluded),
+        path (file or directory) and message substring, most recent first.
+        """
+        where, params = self._where(author, since, until, path, text)
+        rows = self.conn.execute(
+            "SELECT c.sha, c.author_name, c.author_email, c.authored_at, c.message, "
+            "COUNT(f.path), SUM(f.added), SUM(f.removed) "
+            f"FROM commits c LEFT JOIN files f ON f.sha = c.sha{where} "
+            "GROUP BY c.sha ORDER BY c.authored_at DESC LIMIT ?",
+            params + [limit],
+        ).fetchall()
+        return [{
+            "sha": sha,
+            "author": f"{name} <{email}>",
+            "date": datetime.fromtimestamp(authored_at, timezone.utc).strftime("%Y-%m-%d %H:%M"),
+            "subject": message.split("\n", 1)[0],
+            "files": files,
+            "added": added,
+            "removed": removed,
+        } for sha, name, email, authored_at, message, files, added, removed in rows]
+
+    def activity(self, since: str = None, top: int = 5) -> Dict:
+        """
+        Aggregates since a date (all history by default): commits, contributors, churn (None on partial clones),
+        most active authors and most changed files, plus the date of the last commit.
+        """
+        where, params = self._where(since=since)
+        commits, authors, last = self.conn.execute(
+            f"SELECT COUNT(*), COUNT(DISTINCT c.author_email), MAX(c.authored_at) FROM commits c{where}", params
+        ).fetchone()
+        files, added, removed = self.conn.execute(
+            f"SELECT COUNT(DISTINCT f.path), SUM(f.added), SUM(f.removed) FROM commits c JOIN files f ON f.sha = c.sha"
+            f"{where}", params
+        ).fetchone()
+        top_authors = self.conn.execute(
+            f"SELECT c.author_name, COUNT(*) AS n FROM commits c{where} GROUP BY c.author_email ORDER BY n DESC LIMIT ?",
+            params + [top],
+        ).fetchall()
+        top_files = self.conn.execute(
+            "SELECT f.path, COUNT(*) AS n, SUM(f.added) + SUM(f.removed) FROM commits c JOIN files f ON f.sha = c.sha"
+            f"{where} GROUP BY f.path ORDER BY n DESC, 3 DESC LIMIT ?",
+            params + [top],
+        ).fetchall()
+        return {
+            "commits": commits,
+            "contributors": authors,
+            "files_changed": files,
+            "added": added,
+            "removed": removed,
+            "last_commit": datetime.fromtimestamp(last, timezone.utc).strftime("%Y-%m-%d") if last else None,
+            "top_authors": [{"author": name, "commits": n} for name, n in top_authors],
+            "top_files": [{"path": path, "commits": n, "churn": churn} for path, n, churn in top_files],
+        }
+
+    def commit_files(self, sha: str) -> List[Dict]:
+        """Files touched by a commit with their added and removed line counts."""
+        rows = self.conn.execute("SELECT path, added, removed FROM files WHERE sha LIKE ? ORDER BY path",
+                                 (f"{sha}%",)).fetchall()
+        return [{"path": path, "added": added, "removed": removed} for path, added, removed in rows]
+
+
+def update_commit_index(repo_path: str) -> int:
+    """Incrementally updates the commit index of a repository, e.g. after a fetch."""
+    repo = Repo(repo_path)
+    try:
+        with CommitIndex(repo) as index:
+            return index.update()
+    finally:
+        repo.close()
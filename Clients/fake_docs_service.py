@@ -0,0 +1,73 @@
+import uuid
+from typing import Dict
+
+
+class _Call:
+    """Mimics googleapiclient's HttpRequest: the work happens on execute()."""
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def execute(self):
+        return self.fn(*self.args)
+
+
+class _Documents:
+    def __init__(self, service: "FakeDocsService"):
+        self.service = service
+
+    def create(self, body: Dict):
+        return _Call(self.service._create, body)
+
+    def get(self, documentId: str):
+        return _Call(self.service._get, documentId)
+
+    def batchUpdate(self, documentId: str, body: Dict):
+        return _Call(self.service._batch_update, documentId, body)
+
+
+class FakeDocsService:
+    """
+    Local in-memory stand-in for the Google Docs v1 service, for tests and offline runs.
+    Supports documents().create/get/batchUpdate with insertText requests
+    (location index or endOfSegmentLocation) and records every batchUpdate body.
+    """
+
+    def __init__(self):
+        self.texts: Dict[str, str] = {}
+        self.titles: Dict[str, str] = {}
+        self.batch_updates = []
+
+    def documents(self) -> _Documents:
+        return _Documents(self)
+
+    def _create(self, body: Dict) -> Dict:
+        doc_id = str(uuid.uuid4())
+        self.texts[doc_id] = ""
+        self.titles[doc_id] = body.get("title", "Untitled document")
+        return {"documentId": doc_id, "title": self.titles[doc_id]}
+
+    def _get(self, doc_id: str) -> Dict:
+        text = self.texts[doc_id]
+        # Docs indexes start at 1 and the body always ends with a newline
+        return {
+            "documentId": doc_id,
+            "title": self.titles[doc_id],
+            "body": {"content": [{"startIndex": 1, "endIndex": len(text) + 2,
+                                  "paragraph": {"elements": [{"textRun": {"content": text + "\n"}}]}}]},
+        }
+
+    def _batch_update(self, doc_id: str, body: Dict) -> Dict:
+        if doc_id not in self.texts:
+            raise KeyError(f"Document not found: {doc_id}")
+        self.batch_updates.append(body)
+        for request in body["requests"]:
+            insert = request["insertText"]
+            text = self.texts[doc_id]
+            if "endOfSegmentLocation" in insert:
+                position = len(text)
+            else:
+                position = insert["location"]["index"] - 1
+            self.texts[doc_id] = text[:position] + insert["text"] + text[position:]
+        return {"documentId": doc_id, "replies": [{} for _ in body["requests"]]}
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from Clients.outlook_outbox import MAX_BATCH_SIZE
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows in FakeGraphServer.connections
+
+    def setup(self):
+        super().setup()
+        self.server.graph.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: Dict = None, headers: Dict = None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        graph: FakeGraphServer = self.server.graph
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(graph.latency)
+        if self.headers.get("Authorization") != f"Bearer {graph.token}":
+            return self._reply(401, {"error": {"code": "InvalidAuthenticationToken", "message": "Bad token"}})
+        if self.path.endswith("/$batch"):
+            return self._reply(*graph.batch(body.get("requests", [])))
+        if self.path.endswith("/me/sendMail"):
+            status, headers, error = graph.send_mail(body)
+            return self._reply(status, error, headers)
+        self._reply(404, {"error": {"code": "NotFound", "message": self.path}})
+
+
+class FakeGraphServer:
+    """
+    Local HTTP stand-in for the Microsoft Graph endpoints used by the Outlook agent, for tests and benchmarks:
+    POST /v1.0/me/sendMail and POST /v1.0/$batch (sendMail sub-requests only).
+    Records the sent messages, the size of every batch and the number of TCP connections.
+    throttle_every=N answers 429 with Retry-After to every Nth sendMail, single or inside a batch.
+    drop_every=N leaves every Nth sub-request of a batch out of the reply, unprocessed.
+    """
+
+    def __init__(self, latency: float = 0.0, throttle_every: int = 0, retry_after: float = 1, token: str = "test-token",
+                 drop_every: int = 0):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.drop_every = drop_every
+        self.retry_after = retry_after
+        self.token = token
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset()
+
+    def reset(self):
+        self.sent: List[Dict] = []
+        self.batches: List[int] = []
+        self.calls = 0
+        self.sub_requests = 0
+        self.throttled = 0
+        self.dropped = 0
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1.0"
+
+    def start(self) -> "FakeGraphServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.graph = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def send_mail(self, body: Dict):
+        """(status, headers, error body) of one sendMail."""
+        with self._lock:
+            self.calls += 1
+            if self.throttle_every and self.calls % self.throttle_every == 0:
+                self.throttled += 1
+                return 429, {"Retry-After": f"{self.retry_after:g}"}, {
+                    "error": {"code": "ApplicationThrottled", "message": "Too many requests"}}
+            if not body.get("message", {}).get("toRecipients"):
+                return 400, {}, {"error": {"code": "ErrorInvalidRecipients", "message": "No recipients"}}
+            self.sent.append(body["message"])
+            return 202, {}, None
+
+    def batch(self, requests: List[Dict]):
+        if len(requests) > MAX_BATCH_SIZE:
+            return 400, {"error": {"code": "BadRequest", "message": f"Batch limited to {MAX_BATCH_SIZE} requests"}}
+        with self._lock:
+            self.batches.append(len(requests))
+        responses = []
+        for request in requests:
+            with self._lock:
+                self.sub_requests += 1
+                if self.drop_every and self.sub_requests % self.drop_every == 0:
+                    self.dropped += 1
+                    continue
+            if request.get("method") != "POST" or not request.get("url", "").endswith("/me/sendMail"):
+                responses.append({"id": request["id"], "status": 404, "body": {"error": {"message": request.get("url")}}})
+                continue
+            status, headers, error = self.send_mail(request.get("body", {}))
+            responses.append({"id": request["id"], "status": status, "headers": headers, "body": error})
+        return 200, {"responses": responses}
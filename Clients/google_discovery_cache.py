@@ -0,0 +1,53 @@
+import json
+import os
+import threading
+from typing import Dict, Tuple
+
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+DISCOVERY_CACHE_DIR = os.path.join("temp_uploads", ".discovery_cache")
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+_documents: Dict[Tuple[str, str], dict] = {}
+_lock = threading.Lock()
+
+
+def _fetch_document(api: str, version: str) -> str:
+    """Discovery document bundled with googleapiclient, or downloaded when the library has none."""
+    document = get_static_doc(api, version)
+    if document is None:
+        import requests
+        response = requests.get(DISCOVERY_URL.format(api=api, version=version), timeout=10)
+        response.raise_for_status()
+        document = response.text
+    return document
+
+
+def discovery_document(api: str, version: str, cache_dir: str = DISCOVERY_CACHE_DIR) -> dict:
+    """
+    Returns the parsed discovery document of an API.
+    It is parsed once per process and kept on disk, so later workers skip the download.
+    """
+    key = (api, version)
+    with _lock:
+        if key in _documents:
+            return _documents[key]
+
+        path = os.path.join(cache_dir, f"{api}.{version}.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                raw = f.read()
+        else:
+            raw = _fetch_document(api, version)
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(raw)
+
+        _documents[key] = json.loads(raw)
+        return _documents[key]
+
+
+def build_service(api: str, version: str, credentials):
+    """Same as googleapiclient.discovery.build, from the cached discovery document."""
+    return build_from_document(discovery_document(api, version), credentials=credentials)
@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from Clients.commit_index import CommitIndex
+from Clients.read_only_git_client import ReadOnlyGitClient
+
+
+def repo_name(url_or_path: str) -> str:
+    """Last component of a repository url or path, without the .git suffix."""
+    return re.sub(r"\.git$", "", url_or_path.rstrip("/").rsplit("/", 1)[-1].rsplit(":", 1)[-1])
+
+
+def _open(repo: str, workdir: str, clone_mode: str) -> ReadOnlyGitClient:
+    """Opens a local repository as is, updates an existing clone of a url, or clones it into workdir."""
+    if os.path.isdir(repo):
+        return ReadOnlyGitClient(repo)
+    local_path = os.path.join(workdir, repo_name(repo))
+    if os.path.isdir(os.path.join(local_path, ".git")):
+        client = ReadOnlyGitClient(local_path)
+        client.update()
+        return client
+    os.makedirs(local_path, exist_ok=True)
+    return ReadOnlyGitClient(repo, local_path, clone_mode=clone_mode)
+
+
+def analyze_repository(repo: str, workdir: str = "temp_uploads", clone_mode: str = "full",
+                       since: str = None) -> Dict:
+    """
+    Worker: clones or updates one repository, refreshes its commit index and returns its activity
+    since a date next to all-time totals. Errors are returned, not raised, so one bad repository
+    does not fail the batch.
+    """
+    started = time.perf_counter()
+    result = {"repo": repo, "name": repo_name(repo)}
+    try:
+        with _open(repo, workdir, clone_mode) as client:
+            result["path"] = client.repo.working_dir
+            result["head"] = client.repo.head.commit.hexsha[:10]
+            with CommitIndex(client.repo) as index:
+                index.update()
+                result["activity"] = index.activity(since)
+                total = index.activity()
+                result["total_commits"] = total["commits"]
+                result["total_contributors"] = total["contributors"]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {' '.join(str(e).split())}"[:300]
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def analyze_repositories(repos: List[str], workdir: str = "temp_uploads", clone_mode: str = "full",
+                         since_days: int = 30, max_workers: int = None) -> Dict:
+    """
+    Analyzes many repositories in parallel worker processes, at most max_workers at a time
+    (the number of cores by default). Results keep the input order.
+    """
+    repos = list(dict.fromkeys(repos))  # the same url twice would be cloned twice into the same directory
+    since = (datetime.now(timezone.utc) - timedelta(days=since_days)).strftime("%Y-%m-%d")
+    max_workers = max(1, min(max_workers or os.cpu_count(), len(repos)))
+    started = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(analyze_repository, repo, workdir, clone_mode, since): repo for repo in repos}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return {
+        "since": since,
+        "workers": max_workers,
+        "seconds": round(time.perf_counter() - started, 2),
+        "repositories": [results[repo] for repo in repos],
+    }
+
+
+def format_report(report: Dict) -> str:
+    """One line per repository, sorted by recent commits, then the aggregated totals."""
+    lines = [f"Activity since {report['since']} ({len(report['repositories'])} repositories, "
+             f"{report['seconds']}s with {report['workers']} workers)"]
+    ok = [r for r in report["repositories"] if "error" not in r]
+    for r in sorted(ok, key=lambda r: -r["activity"]["commits"]):
+        activity = r["activity"]
+        churn = f"+{activity['added']} -{activity['removed']}" if activity["added"] is not None else "churn n/a"
+        authors = ", ".join(f"{a['author']} ({a['commits']})" for a in activity["top_authors"][:3])
+        lines.append(
+            f"- {r['name']}: {activity['commits']} commits by {activity['contributors']} contributors, "
+            f"{activity['files_changed']} files, {churn}, last commit {activity['last_commit']} "
+            f"| all time {r['total_commits']} commits, {r['total_contributors']} contributors"
+            + (f" | top: {authors}" if authors else "")
+        )
+    for r in report["repositories"]:
+        if "error" in r:
+            lines.append(f"- {r['name']}: failed, {r['error']}")
+
+    lines.append(
+        f"Total: {sum(r['activity']['commits'] for r in ok)} commits, "
+        f"{sum(r['activity']['contributors'] for r in ok)} contributors (summed per repository), "
+        f"+{sum(r['activity']['added'] or 0 for r in ok)} -{sum(r['activity']['removed'] or 0 for r in ok)} lines"
+    )
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Churn, contributors and recent activity of many git repositories.")
+    parser.add_argument("repos", nargs="+", help="repository urls or local paths")
+    parser.add_argument("--since-days", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, the number of cores by default")
+    parser.add_argument("--workdir", default="temp_uploads", help="where urls are cloned")
+    parser.add_argument("--clone-mode", default="full", help="partial clones give no line counts")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = analyze_repositories(args.repos, args.workdir, args.clone_mode, args.since_days, args.workers)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+OUTBOX_PATH = "temp_uploads/outlook_outbox.sqlite"
+
+# Graph JSON batching accepts at most 20 requests per $batch call
+MAX_BATCH_SIZE = 20
+MAX_ATTEMPTS = 5
+REQUEST_TIMEOUT = 30
+# Wait when Graph throttles without a Retry-After header, or fails on its side
+DEFAULT_RETRY_AFTER = 10
+# Wait before trying again when there is no valid token
+NO_TOKEN_RETRY = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    payload TEXT,
+    status TEXT,
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at REAL DEFAULT 0,
+    error TEXT,
+    created_at REAL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_queue ON messages (user_id, status, next_attempt_at);
+"""
+
+
+def mail_payload(subject: str, body: str, recipients: List[str]) -> Dict:
+    """Body of a Graph /me/sendMail request."""
+    return {
+        "message": {
+            "subject": subject,
+            "body": {"contentType": "Text", "content": body},
+            "toRecipients": [{"emailAddress": {"address": addr}} for addr in recipients]
+        },
+        "saveToSentItems": True
+    }
+
+
+def _retry_after(headers: Dict) -> float:
+    headers = {key.lower(): value for key, value in (headers or {}).items()}
+    try:
+        return float(headers.get("retry-after", DEFAULT_RETRY_AFTER))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class Outbox:
+    """
+    Persistent queue of the emails of one user, stored in SQLite and sent by a background thread.
+    Queued emails are sent together in Graph JSON $batch requests of up to MAX_BATCH_SIZE, over one pooled
+    HTTP session. A 429 pauses the outbox for its Retry-After, server errors are retried up to MAX_ATTEMPTS.
+    Emails that were being sent when the process stopped are sent again on restart (at least once delivery).
+    """
+
+    def __init__(self, user_id: str, token_provider: Callable[[], Optional[str]], db_path: str = OUTBOX_PATH,
+                 base_url: str = GRAPH_URL, batch_size: int = MAX_BATCH_SIZE,
+                 refresh_token: Callable[[], Optional[str]] = None):
+        """
+        token_provider returns the current access token, refresh_token is called when Graph refuses it (401)
+        and must drop the cached token, so the next batch does not resend it.
+        """
+        self.user_id = user_id
+        self.token_provider = token_provider
+        self.refresh_token = refresh_token
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE messages SET status = 'queued' WHERE user_id = ? AND status = 'sending'",
+                              (user_id,))
+
+        self._wake = threading.Event()
+        self._paused_until = 0.0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"outbox-{user_id}")
+        self._thread.start()
+
+    def enqueue(self, subject: str, body: str, recipients: List[str]) -> str:
+        """Queues an email and returns its tracking id, without waiting for Graph."""
+        tracking_id = str(uuid.uuid4())
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO messages (id, user_id, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (tracking_id, self.user_id, json.dumps(mail_payload(subject, body, recipients)), time.time()),
+            )
+        self._wake.set()
+        return tracking_id
+
+    def status(self, tracking_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status, attempts, error, created_at, sent_at FROM messages WHERE id = ? AND user_id = ?",
+                (tracking_id, self.user_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["status", "attempts", "error", "created_at", "sent_at"], row))
+
+    def pending(self) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE user_id = ? AND status IN ('queued', 'sending')", (self.user_id,)
+            ).fetchone()[0]
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until every queued email is sent or failed, returns False on timeout."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(REQUEST_TIMEOUT)
+        self.session.close()
+        self.conn.close()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.clear()
+            try:
+                delay = self._send_next_batch()
+            except Exception as e:
+                print(f"Outlook outbox error: {e}")
+                delay = DEFAULT_RETRY_AFTER
+            if delay != 0:
+                self._wake.wait(delay)
+
+    def _due(self) -> Tuple[List[Tuple[str, str]], Optional[float]]:
+        """Up to batch_size emails due now, or the time the next one is due."""
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, payload FROM messages WHERE user_id = ? AND status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY created_at LIMIT ?", (self.user_id, now, self.batch_size),
+            ).fetchall()
+            if rows:
+                return rows, None
+            next_at = self.conn.execute(
+                "SELECT MIN(next_attempt_at) FROM messages WHERE user_id = ? AND status = 'queued'", (self.user_id,)
+            ).fetchone()[0]
+        return [], next_at
+
+    def _send_next_batch(self) -> Optional[float]:
+        """
+        Sends one $batch request, returns how long to wait before the next one:
+        0 to go on, None to sleep until an email is queued.
+        """
+        now = time.time()
+        if now < self._paused_until:
+            return self._paused_until - now
+        rows, next_at = self._due()
+        if not rows:
+            return None if next_at is None else max(0.0, next_at - now)
+
+        ids = [row[0] for row in rows]
+        token = self.token_provider()
+        if not token:
+            self._retry(ids, "Not authenticated, run complete_authentication", NO_TOKEN_RETRY, count=False)
+            return NO_TOKEN_RETRY
+        self._set(ids, "status = 'sending'")
+
+        batch = {"requests": [
+            {"id": tracking_id, "method": "POST", "url": "/me/sendMail",
+             "headers": {"Content-Type": "application/json"}, "body": json.loads(payload)}
+            for tracking_id, payload in rows
+        ]}
+        try:
+            response = self.session.post(f"{self.base_url}/$batch", json=batch, timeout=REQUEST_TIMEOUT,
+                                         headers={"Authorization": f"Bearer {token}"})
+        except requests.RequestException as e:
+            self._retry(ids, f"Graph unreachable: {e}", DEFAULT_RETRY_AFTER)
+            return 0
+
+        if response.status_code == 429:
+            return self._throttled(ids, response.headers)
+        if response.status_code == 401:
+            if self.refresh_token:
+                self.refresh_token()
+            self._retry(ids, "Graph refused the token (401)", 1)
+            return 0
+        if response.status_code >= 500:
+            self._retry(ids, f"Graph error {response.status_code}", _retry_after(response.headers))
+            return 0
+        if response.status_code != 200:
+            self._fail(ids, f"{response.status_code} - {response.text}")
+            return 0
+
+        delay = 0.0
+        responses = response.json().get("responses", [])
+        # Emails Graph did not answer for are sent again, instead of staying 'sending' forever
+        answered = {item.get("id") for item in responses}
+        unanswered = [tracking_id for tracking_id in ids if tracking_id not in answered]
+        if unanswered:
+            self._retry(unanswered, "No response in the $batch reply", DEFAULT_RETRY_AFTER)
+        for item in responses:
+            if item.get("id") not in ids:
+                continue
+            tracking_id, status = item["id"], int(item["status"])
+            if 200 <= status < 300:
+                self._set([tracking_id], "status = 'sent', error = NULL, sent_at = ?", (time.time(),))
+            elif status == 429:
+                delay = max(delay, self._throttled([tracking_id], item.get("headers")))
+            elif status >= 500:
+                self._retry([tracking_id], f"Graph error {status}", _retry_after(item.get("headers")))
+            else:
+                error = (item.get("body") or {}).get("error", {}).get("message", "")
+                self._fail([tracking_id], f"{status} - {error}")
+        return delay
+
+    def _throttled(self, ids: List[str], headers: Dict) -> float:
+        """Throttling is per mailbox: the whole outbox waits for Retry-After, the emails keep their attempts."""
+        retry_after = _retry_after(headers)
+        self._paused_until = max(self._paused_until, time.time() + retry_after)
+        self._retry(ids, f"Throttled, retrying in {retry_after:g}s", retry_after, count=False)
+        return retry_after
+
+    def _set(self, ids: List[str], assignments: str, params: tuple = ()):
+        with self._lock, self.conn:
+            self.conn.executemany(f"UPDATE messages SET {assignments} WHERE id = ?",
+                                  [(*params, tracking_id) for tracking_id in ids])
+
+    def _retry(self, ids: List[str], error: str, delay: float, count: bool = True):
+        self._set(ids, "attempts = attempts + ?, next_attempt_at = ?, error = ?, "
+                       "status = CASE WHEN attempts + ? >= ? THEN 'failed' ELSE 'queued' END",
+                  (int(count), time.time() + delay, error, int(count), MAX_ATTEMPTS))
+
+    def _fail(self, ids: List[str], error: str):
+        self._set(ids, "status = 'failed', attempts = attempts + 1, error = ?", (error,))
+
+
+_outboxes: Dict[Tuple[str, str], Outbox] = {}
+_outboxes_lock = threading.Lock()
+
+
+def get_outbox(user_id: str, token_provider: Callable[[], Optional[str]], base_url: str = GRAPH_URL,
+               db_path: str = OUTBOX_PATH, refresh_token: Callable[[], Optional[str]] = None) -> Outbox:
+    """The outbox of a user, shared by the agents of the process, its sender thread starts with it."""
+    with _outboxes_lock:
+        key = (user_id, base_url)
+        if key not in _outboxes:
+            _outboxes[key] = Outbox(user_id, token_provider, db_path=db_path, base_url=base_url,
+                                    refresh_token=refresh_token)
+        return _outboxes[key]
+
+
+def main():
+    import argparse
+    from Clients.fake_graph_server import FakeGraphServer
+    parser = argparse.ArgumentParser(description="Send a campaign to the local Graph stub, one by one then via the outbox.")
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency per HTTP request, in seconds")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer 429 to every Nth message")
+    args = parser.parse_args()
+
+    with FakeGraphServer(latency=args.latency, throttle_every=args.throttle_every, retry_after=0.2) as server:
+        started = time.perf_counter()
+        with requests.Session() as session:
+            for i in range(args.emails):
+                session.post(f"{server.url}/me/sendMail", json=mail_payload(f"Campaign {i}", "Hello", ["a@example.com"]),
+                             headers={"Authorization": f"Bearer {server.token}"}, timeout=REQUEST_TIMEOUT)
+        sequential = time.perf_counter() - started
+        server.reset()
+
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = Outbox("campaign", lambda: server.token, db_path=os.path.join(tmp, "outbox.sqlite"),
+                            base_url=server.url)
+            started = time.perf_counter()
+            ids = [outbox.enqueue(f"Campaign {i}", "Hello", ["a@example.com"]) for i in range(args.emails)]
+            queued = time.perf_counter() - started
+            outbox.flush()
+            batched = time.perf_counter() - started
+            sent = sum(outbox.status(tracking_id)["status"] == "sent" for tracking_id in ids)
+            outbox.close()
+
+    print(f"{args.emails} emails, {args.latency * 1000:g} ms per request")
+    print(f"  one sendMail each: {sequential:.2f}s")
+    print(f"  outbox: queued in {queued * 1000:.1f} ms, all sent after {batched:.2f}s, "
+          f"{sent} sent in {len(server.batches)} $batch requests over {server.connections} connection(s), "
+          f"{server.throttled} throttled")
+
+
+if __name__ == "__main__":
+    main()
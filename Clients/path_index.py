@@ -0,0 +1,153 @@
+import bisect
+import fnmatch
+import json
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict, Counter
+from typing import Dict, List, Optional
+
+from git import Repo
+
+MEMORY_CACHE_SIZE = 32
+
+
+class PathIndex:
+    """
+    File paths of one git tree, sorted, with their blob shas.
+    Trees never change, so the index is built once per tree sha and persisted in the repository git dir.
+    A directory listing is a bisect range over the sorted paths, no tree traversal is needed.
+    """
+
+    def __init__(self, tree_sha: str, paths: List[str], blob_shas: List[str]):
+        self.tree_sha = tree_sha
+        self.paths = paths
+        self.blob_shas = blob_shas
+        self._sizes = None
+
+    @classmethod
+    def build(cls, repo: Repo, tree_sha: str) -> "PathIndex":
+        """
+        Lists the tree with a single `git ls-tree`. Only trees are read, so partial clones fetch no blob.
+        """
+        entries = []
+        for record in repo.git.ls_tree("-r", "-z", "--full-tree", tree_sha).split("\0"):
+            if not record:
+                continue
+            meta, path = record.split("\t", 1)
+            _, object_type, sha = meta.split()
+            if object_type == "blob":
+                entries.append((path, sha))
+        entries.sort()
+        return cls(tree_sha, [path for path, _ in entries], [sha for _, sha in entries])
+
+    def save(self, file_path: str):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"tree": self.tree_sha, "paths": self.paths, "blobs": self.blob_shas}, f)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "PathIndex":
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["tree"], data["paths"], data["blobs"])
+
+    def _range(self, directory: str):
+        prefix = directory.strip("/") + "/" if directory.strip("/") else ""
+        start = bisect.bisect_left(self.paths, prefix)
+        # "\U0010ffff" sorts after any character a path can contain
+        end = bisect.bisect_left(self.paths, prefix + "\U0010ffff")
+        return start, end
+
+    def list(self, directory: str = "") -> List[str]:
+        """All files under a directory, recursively."""
+        start, end = self._range(directory)
+        return self.paths[start:end]
+
+    def search(self, pattern: str, directory: str = "") -> List[str]:
+        """Files matching a regex, optionally restricted to a directory."""
+        regex = re.compile(pattern)
+        return [path for path in self.list(directory) if regex.search(path)]
+
+    def glob(self, pattern: str, directory: str = "") -> List[str]:
+        """Files matching a shell glob, e.g. '*.py' or 'src/**/test_*.py'."""
+        return fnmatch.filter(self.list(directory), pattern)
+
+    def children(self, directory: str = "") -> Dict[str, int]:
+        """
+        Immediate children of a directory. Files map to 1, sub-directories (ending with '/')
+        to the number of files they contain.
+        """
+        start, end = self._range(directory)
+        prefix_length = len(directory.strip("/") + "/") if directory.strip("/") else 0
+        counts = Counter()
+        for path in self.paths[start:end]:
+            name, separator, _ = path[prefix_length:].partition("/")
+            counts[name + separator] += 1
+        return dict(counts)
+
+    def blob_sizes(self, repo: Repo) -> List[Optional[int]]:
+        """
+        Size in bytes of each blob, None when the blob is not available locally (partial clones).
+        Read once with a single `git cat-file --batch-check`, without fetching missing blobs.
+        """
+        if self._sizes is None:
+            command = ["git", f"--git-dir={repo.git_dir}", "cat-file", "--batch-check=%(objectname) %(objectsize)"]
+            if is_partial_clone(repo):
+                # Only lists the objects present locally, asking for a missing blob would fetch it
+                result = subprocess.run(command + ["--batch-all-objects"], capture_output=True, check=True)
+            else:
+                result = subprocess.run(command, input="\n".join(self.blob_shas).encode(), capture_output=True,
+                                        check=True)
+            sizes = {}
+            for line in result.stdout.decode().splitlines():
+                sha, _, size = line.partition(" ")
+                if size.isdigit():
+                    sizes[sha] = int(size)
+            self._sizes = [sizes.get(sha) for sha in self.blob_shas]
+        return self._sizes
+
+    def blob_sha(self, path: str) -> Optional[str]:
+        position = bisect.bisect_left(self.paths, path)
+        if position < len(self.paths) and self.paths[position] == path:
+            return self.blob_shas[position]
+        return None
+
+
+def is_partial_clone(repo: Repo) -> bool:
+    """True when a remote is a promisor, i.e. missing objects are fetched on demand."""
+    reader = repo.config_reader()
+    return any(reader.get_value(section, "promisor", False)
+               for section in reader.sections() if section.startswith("remote "))
+
+
+_memory_cache: "OrderedDict[tuple, PathIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_path_index(repo: Repo, sha: str = None) -> PathIndex:
+    """
+    Returns the PathIndex of a commit (HEAD by default), from memory, from disk, or built once.
+    """
+    tree_sha = repo.commit(sha).tree.hexsha if sha else repo.head.commit.tree.hexsha
+    key = (repo.git_dir, tree_sha)
+    with _lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    file_path = os.path.join(repo.git_dir, "agent-cache", "paths", f"{tree_sha}.json")
+    if os.path.exists(file_path):
+        index = PathIndex.load(file_path)
+    else:
+        index = PathIndex.build(repo, tree_sha)
+        index.save(file_path)
+
+    with _lock:
+        _memory_cache[key] = index
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return index
@@ -1,17 +1,78 @@
+import mimetypes
+import os
+
 from git import Repo
-import re
-from typing import List
+from typing import Dict, Iterator, List, Tuple
+
+from Clients.commit_index import CommitIndex
+from Clients.lru_cache import ByteLRUCache
+from Clients.path_index import get_path_index
+from Clients.repo_map import get_repo_map
+
+# Partial clone modes, missing blobs are fetched on demand from the promisor remote
+CLONE_MODES = {
+    "full": {},
+    "shallow": {"depth": 1, "single_branch": True},
+    "blobless": {"filter": "blob:none"},
+    "blobless_single_branch": {"filter": "blob:none", "single_branch": True},
+}
+
+# Diff pages are sized for the LLM context, about 4 bytes per token
+BYTES_PER_TOKEN = 4
+DEFAULT_DIFF_BYTES = 32_000
+MAX_FILE_DIFF_BYTES = 256_000
+MAX_CACHED_DIFF_BYTES = 4_000_000
+
+# Escapes of the C-style quoted paths in git output, besides \\ooo octal bytes
+C_ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13, '"': 34, "\\": 92}
+
+# Content search limits
+MAX_GREP_BLOB_BYTES = 1_000_000
+MAX_GREP_LINE_CHARS = 300
+MAX_GREP_EXCLUDES = 100
+
+# File reads: blobs up to MAX_CACHED_BLOB_BYTES are decoded once and cached, bigger ones are streamed by line range
+MAX_CACHED_BLOB_BYTES = 4_000_000
+DEFAULT_FILE_LINES = 2000
+BINARY_SNIFF_BYTES = 8000
+
+# Diffs between two commit shas never change, shared by every client of the process
+_diff_cache = ByteLRUCache(64_000_000)
+# Decoded blobs keyed by blob sha, identical content is shared across commits and paths
+_blob_cache = ByteLRUCache(128_000_000)
 
 class ReadOnlyGitClient:
-    def __init__(self, repo_url_or_path: str, local_path: str = None):
+    def __init__(self, repo_url_or_path: str, local_path: str = None, clone_mode: str = "full", **clone_options):
         """
         Initializes the client. Clones if a local path is provided, otherwise opens a local repo.
+
+        clone_mode is one of CLONE_MODES, clone_options (depth, single_branch, branch, shallow_since, filter)
+        override it. Partial clones of a local repository need a file:// url.
         """
         if local_path:
-            self.repo = Repo.clone_from(repo_url_or_path, local_path)
+            self.repo = Repo.clone_from(repo_url_or_path, local_path, **self.clone_options(clone_mode, **clone_options))
         else:
             self.repo = Repo(repo_url_or_path)
 
+    @staticmethod
+    def clone_options(clone_mode: str = "full", **overrides) -> dict:
+        """
+        Builds the `git clone` options of a clone mode.
+        """
+        if clone_mode not in CLONE_MODES:
+            raise ValueError(f"Unsupported clone mode: '{clone_mode}'. Expected one of {list(CLONE_MODES)}.")
+        options = dict(CLONE_MODES[clone_mode])
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return options
+
+    @classmethod
+    def from_repo(cls, repo: Repo) -> "ReadOnlyGitClient":
+        """
+        Wraps an already opened repository, e.g. a handle leased from a RepoPool.
+        """
+        client = cls.__new__(cls)
+        client.repo = repo
+        return client
     
     def __enter__(self):
         return self
@@ -19,6 +80,30 @@ class ReadOnlyGitClient:
     def __exit__(self, exc_type, exc, tb):
         self.repo.close()    
 
+    def update(self) -> List:
+        """
+        Fetches origin and fast-forwards the local branches that track it.
+        Shallow and partial clones stay shallow and partial.
+
+        Returns the names of the updated branches.
+        """
+        origin = self.repo.remotes.origin
+        origin.fetch()
+        updated = []
+        active = None if self.repo.head.is_detached else self.repo.active_branch
+        for head in self.repo.heads:
+            tracking = head.tracking_branch()
+            if tracking is None or head.commit == tracking.commit:
+                continue
+            if not self.repo.is_ancestor(head.commit, tracking.commit):
+                continue
+            if head == active:
+                self.repo.git.merge("--ff-only", tracking.name)
+            else:
+                head.commit = tracking.commit
+            updated.append(head.name)
+        return updated
+
     def list_branches(self, remote: bool = False) -> List:
         """
         Lists the local or remote branches.
@@ -41,6 +126,23 @@ class ReadOnlyGitClient:
         commits = list(self.repo.iter_commits(rev, max_count=max_count))
         return [commit.hexsha for commit in commits]
 
+    def search_commits(self, author: str = None, since: str = None, until: str = None, path: str = None,
+                       text: str = None, limit: int = 50) -> List[Dict]:
+        """
+        Queries the SQLite commit index, updated first with the commits that are not indexed yet.
+        """
+        with CommitIndex(self.repo) as index:
+            index.update()
+            return index.query(author=author, since=since, until=until, path=path, text=text, limit=limit)
+
+    def get_commit_files(self, sha: str) -> List[Dict]:
+        """
+        Files touched by a commit, with added and removed line counts.
+        """
+        with CommitIndex(self.repo) as index:
+            index.update()
+            return index.commit_files(self.repo.commit(sha).hexsha)
+
     def get_commit(self, sha: str) ->str:
         """
         Retrieves a commit object by its SHA.
@@ -53,41 +155,289 @@ class ReadOnlyGitClient:
         """
         return self.repo.commit(branch).hexsha
 
-    def get_file_contents(self, filepath: str, sha: str = None) -> str:
+    def get_file_contents(self, filepath: str, sha: str = None, start_line: int = None,
+                          end_line: int = None) -> str:
         """
-        Retrieves the content of a file at a given commit.
+        Retrieves the content of a file at a given commit, optionally lines start_line to end_line (1-based, included).
+        Binary files are summarized instead of decoded. Files bigger than MAX_CACHED_BLOB_BYTES are streamed
+        and return at most DEFAULT_FILE_LINES lines when no range is given.
         """
         commit = self.repo.commit(sha) if sha else self.repo.head.commit
         blob = commit.tree / filepath
-        return blob.data_stream.read().decode('utf-8')
+        if blob.size > MAX_CACHED_BLOB_BYTES:
+            return self._read_large_blob(filepath, blob.hexsha, blob.size, start_line, end_line)
+
+        # (is_binary, text): the cache is keyed by blob, the summary of a binary file is built per path
+        entry = _blob_cache.get(blob.hexsha)
+        if entry is None:
+            data = blob.data_stream.read()
+            if self._is_binary(data):
+                entry = (True, None)
+            else:
+                entry = (False, data.decode("utf-8", errors="replace"))
+            _blob_cache.put(blob.hexsha, entry, len(entry[1] or "") + 64)
+        is_binary, text = entry
+        if is_binary:
+            return self._binary_summary(filepath, blob.hexsha, blob.size)
+        if start_line is None and end_line is None:
+            return text
+        lines = text.splitlines(keepends=True)
+        start = max(start_line or 1, 1)
+        return "".join(lines[start - 1:end_line])
+
+    @staticmethod
+    def _is_binary(data: bytes) -> bool:
+        """Same heuristic as git: a NUL byte in the first 8000 bytes."""
+        return b"\0" in data[:BINARY_SNIFF_BYTES]
+
+    @staticmethod
+    def _binary_summary(filepath: str, blob_sha: str, size: int) -> str:
+        mime_type = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+        return f"[binary file {filepath}: {mime_type}, {size} bytes, blob {blob_sha[:10]}]"
 
-    def get_diff(self, sha1: str, sha2: str):
+    def _read_large_blob(self, filepath: str, blob_sha: str, size: int, start_line: int = None,
+                         end_line: int = None) -> str:
         """
-        Retrieves the diff between two commits.
+        Streams `git cat-file blob` and keeps only the requested lines, the process is stopped after end_line.
+        """
+        start = max(start_line or 1, 1)
+        end = end_line if end_line is not None else start + DEFAULT_FILE_LINES - 1
+        process = self.repo.git.cat_file("blob", blob_sha, as_process=True)
+        lines, number = [], 0
+        try:
+            head = process.stdout.peek(BINARY_SNIFF_BYTES)[:BINARY_SNIFF_BYTES]
+            if self._is_binary(head):
+                return self._binary_summary(filepath, blob_sha, size)
+            for raw in process.stdout:
+                number += 1
+                if number >= start:
+                    lines.append(raw.decode("utf-8", errors="replace"))
+                if number >= end:
+                    break
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.proc.wait()
+        if end_line is None:
+            lines.append(f"[... {filepath} is {size} bytes, showing lines {start}-{start + len(lines) - 1}, "
+                         f"pass start_line and end_line to read further ...]\n")
+        return "".join(lines)
+
+    def _resolve(self, rev: str) -> str:
+        return self.repo.commit(rev).hexsha
+
+    def get_diffstat(self, sha1: str, sha2: str, paths: List[str] = None) -> List[Dict]:
         """
-        return self.repo.git.diff(sha1, sha2)
+        Per-file added and removed line counts between two commits (None for binary files).
+        """
+        key = ("stat", self.repo.git_dir, self._resolve(sha1), self._resolve(sha2), tuple(paths or ()))
+        stats = _diff_cache.get(key)
+        if stats is None:
+            output = self.repo.git.diff("--numstat", "--no-renames", "-z", key[2], key[3], "--", *(paths or []))
+            stats = []
+            for record in output.split("\0"):
+                if not record:
+                    continue
+                added, removed, path = record.split("\t", 2)
+                stats.append({
+                    "path": path,
+                    "added": None if added == "-" else int(added),
+                    "removed": None if removed == "-" else int(removed),
+                })
+            _diff_cache.put(key, stats, sum(len(stat["path"]) + 64 for stat in stats))
+        return stats
+
+    def get_diff_summary(self, sha1: str, sha2: str, paths: List[str] = None) -> str:
+        """
+        Diffstat of two commits: one line per file, then the totals.
+        """
+        stats = self.get_diffstat(sha1, sha2, paths)
+        lines = [f"{stat['path']} | " + ("binary" if stat["added"] is None else f"+{stat['added']} -{stat['removed']}")
+                 for stat in stats]
+        added = sum(stat["added"] or 0 for stat in stats)
+        removed = sum(stat["removed"] or 0 for stat in stats)
+        lines.append(f"{len(stats)} files changed, {added} insertions(+), {removed} deletions(-)")
+        return "\n".join(lines)
+
+    def _stream_file_diffs(self, sha1: str, sha2: str, paths: List[str] = None,
+                           max_file_bytes: int = MAX_FILE_DIFF_BYTES) -> Iterator[Tuple[str, str]]:
+        """
+        Streams `git diff` and yields (path, diff) per file, without holding the whole output.
+        Each file diff is truncated to max_file_bytes.
+        """
+        # The prefixes are pinned, diff.noprefix in the user config would change the headers
+        process = self.repo.git.diff("--no-renames", "--no-color", "--src-prefix=a/", "--dst-prefix=b/", sha1, sha2,
+                                     "--", *(paths or []), as_process=True)
+        path, lines, size = None, [], 0
+        try:
+            for raw in process.stdout:
+                line = raw.decode("utf-8", errors="replace")
+                if line.startswith("diff --git "):
+                    if path is not None:
+                        yield path, "".join(lines)
+                    path = self._header_path(line[len("diff --git "):].rstrip("\n"))
+                    lines, size = [line], len(raw)
+                elif size < max_file_bytes:
+                    lines.append(line)
+                    size += len(raw)
+                    if size >= max_file_bytes:
+                        lines.append(f"[... diff of {path} truncated at {max_file_bytes} bytes ...]\n")
+            if path is not None:
+                yield path, "".join(lines)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.proc.wait()
+
+    @staticmethod
+    def _header_path(header: str) -> str:
+        """
+        Path of a `diff --git` header without renames, "a/<path> b/<path>". Git quotes a path
+        with special or non-ASCII characters C-style, e.g. "a/caf\\303\\251.txt".
+        """
+        if not header.startswith('"'):
+            return header[2:2 + (len(header) - 5) // 2] if header.startswith("a/") else header
+        path, i = bytearray(), 1
+        while header[i] != '"':
+            if header[i] != "\\":
+                path += header[i].encode()
+                i += 1
+            elif header[i + 1] in C_ESCAPES:
+                path.append(C_ESCAPES[header[i + 1]])
+                i += 2
+            else:
+                path.append(int(header[i + 1:i + 4], 8))
+                i += 4
+        return path.decode("utf-8", errors="replace")[2:]
+
+    def iter_file_diffs(self, sha1: str, sha2: str, paths: List[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Yields (path, diff) per file. Diffs up to MAX_CACHED_DIFF_BYTES are cached by pair of commit shas,
+        bigger ones are streamed on every call.
+        """
+        key = ("diff", self.repo.git_dir, self._resolve(sha1), self._resolve(sha2), tuple(paths or ()))
+        files = _diff_cache.get(key)
+        if files is None:
+            files, total = [], 0
+            for path, text in self._stream_file_diffs(key[2], key[3], paths):
+                files.append((path, text))
+                total += len(text)
+                if total > MAX_CACHED_DIFF_BYTES:
+                    files = None
+                    break
+            if files is None:
+                yield from self._stream_file_diffs(key[2], key[3], paths)
+                return
+            _diff_cache.put(key, files, total)
+        yield from files
+
+    def get_diff(self, sha1: str, sha2: str, paths: List[str] = None, offset: int = 0,
+                 max_bytes: int = DEFAULT_DIFF_BYTES, max_tokens: int = None) -> str:
+        """
+        Retrieves one page of the diff between two commits: whole file diffs starting at the offset-th file,
+        until max_bytes (or about max_tokens) is reached. The footer gives the offset of the next page.
+        """
+        if max_tokens:
+            max_bytes = min(max_bytes, max_tokens * BYTES_PER_TOKEN)
+        page, size, index = [], 0, -1
+        for index, (path, text) in enumerate(self.iter_file_diffs(sha1, sha2, paths)):
+            if index < offset:
+                continue
+            if page and size + len(text) > max_bytes:
+                return "".join(page) + f"\n[... more files, call again with offset={index} ...]"
+            if not page and len(text) > max_bytes:
+                text = text[:max_bytes] + f"\n[... diff of {path} truncated at {max_bytes} bytes ...]\n"
+            page.append(text)
+            size += len(text)
+        if not page:
+            return f"No diff from file {offset} ({index + 1} files in total)."
+        return "".join(page)
     
-    def get_last_diff(self, branch: str = 'main') -> str:
+    def get_last_diff(self, branch: str = 'main', max_bytes: int = DEFAULT_DIFF_BYTES) -> str:
         """
-        Returns the diff between the last two commits on a given branch.
+        Returns the diffstat and the first page of the diff between the last two commits on a given branch.
         """
         commits = self.list_commits(branch=branch, max_count=2)
         if len(commits) < 2:
             raise ValueError("Not enough commits to generate a diff.")
         sha1, sha2 = commits[1], commits[0]
-        return self.get_diff(sha1, sha2)
+        return (f"Diff {sha1}..{sha2}\n{self.get_diff_summary(sha1, sha2)}\n\n"
+                f"{self.get_diff(sha1, sha2, max_bytes=max_bytes)}")
 
-    def search_files(self, pattern: str, sha: str = None) -> List:
+    def search_files(self, pattern: str, sha: str = None, glob: bool = False, directory: str = "") -> List:
         """
-        Searches for files by regex in the commit's tree.
+        Searches for files by regex (or shell glob) in the commit's tree.
         """
-        commit = self.repo.commit(sha) if sha else self.repo.head.commit
-        regex = re.compile(pattern)
-        return [blob.path for blob in commit.tree.traverse() if blob.type == 'blob' and regex.search(blob.path)]
+        index = get_path_index(self.repo, sha)
+        if glob:
+            return index.glob(pattern, directory)
+        return index.search(pattern, directory)
 
-    def get_tree(self, sha: str = None) -> List:
+    def grep(self, pattern: str, sha: str = None, paths: List[str] = None, ignore_case: bool = False,
+             fixed_string: bool = False, context: int = 0, max_matches: int = 100,
+             max_blob_bytes: int = MAX_GREP_BLOB_BYTES) -> List[Dict]:
         """
-        Lists all the files in the repository at a given commit.
+        Searches file contents at a commit with `git grep` (multi-threaded, binary files skipped).
+        Blobs bigger than max_blob_bytes are skipped, output stops after max_matches.
+
+        Returns:
+            List[Dict]: {"path", "line", "text", "context": [(line, text)]} per match.
         """
         commit = self.repo.commit(sha) if sha else self.repo.head.commit
-        return [blob.path for blob in commit.tree.traverse() if blob.type == 'blob']
+        index = get_path_index(self.repo, commit.hexsha)
+        oversized = {path: size for path, size in zip(index.paths, index.blob_sizes(self.repo))
+                     if size is not None and size > max_blob_bytes}
+        # Only the biggest blobs are excluded in the pathspec, the command line stays short; other hits are dropped
+        excluded = [f":(exclude,literal){path}"
+                    for path in sorted(oversized, key=oversized.get, reverse=True)[:MAX_GREP_EXCLUDES]]
+
+        options = ["-n", "-I", "-z", f"--threads={os.cpu_count() or 1}", "-F" if fixed_string else "-E"]
+        if ignore_case:
+            options.append("-i")
+        process = self.repo.git.grep(*options, "-e", pattern, commit.hexsha, "--", *(paths or ["."]), *excluded,
+                                     as_process=True)
+        matches = []
+        try:
+            for raw in process.stdout:
+                # <sha>:<path>\0<line>\0<text>
+                location, line, text = raw.decode("utf-8", errors="replace").rstrip("\n").split("\0", 2)
+                path = location[len(commit.hexsha) + 1:]
+                if path in oversized:
+                    continue
+                matches.append({"path": path, "line": int(line),
+                                "text": text[:MAX_GREP_LINE_CHARS], "context": []})
+                if len(matches) >= max_matches:
+                    break
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.proc.wait()
+
+        if context:
+            for path in {match["path"] for match in matches}:
+                lines = self.get_file_contents(path, commit.hexsha).splitlines()
+                for match in (m for m in matches if m["path"] == path):
+                    first = max(1, match["line"] - context)
+                    match["context"] = [(n, lines[n - 1][:MAX_GREP_LINE_CHARS])
+                                        for n in range(first, min(len(lines), match["line"] + context) + 1)]
+        return matches
+
+    def get_tree(self, sha: str = None, directory: str = "") -> List:
+        """
+        Lists all the files in the repository at a given commit, optionally under a directory.
+        """
+        return get_path_index(self.repo, sha).list(directory)
+
+    def get_repo_map(self, sha: str = None, directory: str = "", max_depth: int = 2,
+                     max_tokens: int = 3000) -> str:
+        """
+        Compact structure of the repository at a given commit: languages, line counts per directory
+        and top-level definitions per file. Built once per tree and cached.
+        """
+        return get_repo_map(self.repo, sha).render(directory, max_depth, max_tokens * BYTES_PER_TOKEN)
+
+    def list_directory(self, directory: str = "", sha: str = None) -> Dict[str, int]:
+        """
+        Lists the immediate children of a directory, sub-directories with their file count.
+        """
+        return get_path_index(self.repo, sha).children(directory)
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from git import Repo
+
+from Clients.path_index import get_path_index, is_partial_clone
+
+# Only files of a known language are read, so partial clones never fetch images or archives
+LANGUAGES = {
+    ".py": "Python", ".ipynb": "Jupyter", ".js": "JavaScript", ".jsx": "JavaScript", ".mjs": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript", ".java": "Java", ".kt": "Kotlin", ".scala": "Scala",
+    ".go": "Go", ".rs": "Rust", ".c": "C", ".h": "C", ".cc": "C++", ".cpp": "C++", ".hpp": "C++",
+    ".cs": "C#", ".rb": "Ruby", ".php": "PHP", ".swift": "Swift", ".sh": "Shell", ".sql": "SQL",
+    ".html": "HTML", ".css": "CSS", ".scss": "CSS", ".md": "Markdown", ".rst": "reStructuredText",
+    ".json": "JSON", ".yaml": "YAML", ".yml": "YAML", ".toml": "TOML", ".xml": "XML",
+}
+
+# Top-level definitions: the pattern must match at column 0, the last group is the name
+DEFINITION_PATTERNS = {
+    "Python": re.compile(r"^(?:async\s+)?(class|def)\s+(\w+)", re.M),
+    "JavaScript": re.compile(r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?(class|function\*?|const)\s+(\w+)", re.M),
+    "TypeScript": re.compile(
+        r"^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+        r"(class|function|interface|type|enum|const)\s+(\w+)", re.M),
+    "Java": re.compile(r"^(?:public\s+|final\s+|abstract\s+|sealed\s+)*(class|interface|enum|record)\s+(\w+)", re.M),
+    "Kotlin": re.compile(r"^(?:\w+\s+)*?(class|interface|object|fun)\s+(\w+)", re.M),
+    "Scala": re.compile(r"^(?:\w+\s+)*?(class|trait|object)\s+(\w+)", re.M),
+    "C#": re.compile(r"^\s{0,4}(?:public\s+|internal\s+|static\s+|sealed\s+|abstract\s+|partial\s+)*"
+                     r"(class|interface|struct|enum|record)\s+(\w+)", re.M),
+    "Go": re.compile(r"^(func|type)\s+(?:\([^)]*\)\s*)?(\w+)", re.M),
+    "Rust": re.compile(r"^(?:pub(?:\([^)]*\))?\s+)?(fn|struct|enum|trait|mod|type)\s+(\w+)", re.M),
+    "Ruby": re.compile(r"^(class|module|def)\s+([\w:.]+)", re.M),
+    "PHP": re.compile(r"^(?:abstract\s+|final\s+)?(class|interface|trait|function)\s+(\w+)", re.M),
+    "Swift": re.compile(r"^(?:public\s+|open\s+|final\s+)*(class|struct|enum|protocol|func)\s+(\w+)", re.M),
+}
+
+MAX_MAP_BLOB_BYTES = 1_000_000
+MAX_DEFINITIONS_PER_FILE = 30
+# Below this many files the pool start-up costs more than it saves
+MIN_FILES_FOR_POOL = 200
+BATCH_BYTES = 4_000_000
+BATCH_FILES = 200
+MEMORY_CACHE_SIZE = 16
+
+
+def language_of(path: str) -> str:
+    return LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+
+def _object_sizes(git_dir: str, shas: List[str]) -> Dict[str, int]:
+    result = subprocess.run(["git", f"--git-dir={git_dir}", "cat-file", "--batch-check=%(objectname) %(objectsize)"],
+                            input="\n".join(shas).encode(), capture_output=True, check=True)
+    sizes = {}
+    for line in result.stdout.decode().splitlines():
+        sha, _, size = line.partition(" ")
+        if size.isdigit():
+            sizes[sha] = int(size)
+    return sizes
+
+
+def _analyze_batch(git_dir: str, entries: List[Tuple[str, str, int]]) -> List[list]:
+    """
+    Worker: reads a batch of (path, blob sha, size) with one `git cat-file --batch` and returns
+    [path, language, lines, definitions] per file. Blobs over MAX_MAP_BLOB_BYTES or missing are not read.
+    """
+    readable = [(path, sha) for path, sha, size in entries if size is not None and size <= MAX_MAP_BLOB_BYTES]
+    skipped = [[path, language_of(path), None, []] for path, _, size in entries
+               if size is None or size > MAX_MAP_BLOB_BYTES]
+    if not readable:
+        return skipped
+
+    output = subprocess.run(["git", f"--git-dir={git_dir}", "cat-file", "--batch"],
+                            input="\n".join(sha for _, sha in readable).encode(), capture_output=True,
+                            check=True).stdout
+    results, position = [], 0
+    for path, _ in readable:
+        header_end = output.index(b"\n", position)
+        size = int(output[position:header_end].split()[2])
+        data = output[header_end + 1:header_end + 1 + size]
+        position = header_end + 1 + size + 1
+        language = language_of(path)
+        if b"\0" in data[:8000]:
+            results.append([path, language, None, []])
+            continue
+        text = data.decode("utf-8", errors="replace")
+        pattern = DEFINITION_PATTERNS.get(language)
+        definitions = [f"{kind} {name}" for kind, name in pattern.findall(text)][:MAX_DEFINITIONS_PER_FILE] \
+            if pattern else []
+        results.append([path, language, text.count("\n") + (not text.endswith("\n") and bool(text)), definitions])
+    return results + skipped
+
+
+def _batches(entries: List[Tuple[str, str]], sizes: Dict[str, int]) -> List[List[Tuple[str, str, int]]]:
+    batches, current, current_bytes = [], [], 0
+    for path, blob_sha in entries:
+        size = sizes.get(blob_sha)
+        current.append((path, blob_sha, size))
+        current_bytes += min(size or 0, MAX_MAP_BLOB_BYTES)
+        if current_bytes >= BATCH_BYTES or len(current) >= BATCH_FILES:
+            batches.append(current)
+            current, current_bytes = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _prefetch_blobs(repo: Repo, shas: List[str]):
+    """
+    Fetches the missing blobs of a partial clone in one round trip, instead of one lazy fetch per blob.
+    Failures are ignored, `git cat-file` then falls back to lazy fetching.
+    """
+    reader = repo.config_reader()
+    remotes = [section.split('"')[1] for section in reader.sections()
+               if section.startswith("remote ") and reader.get_value(section, "promisor", False)]
+    if not shas or not remotes:
+        return
+    subprocess.run(["git", f"--git-dir={repo.git_dir}", "-c", "fetch.negotiationAlgorithm=noop", "fetch", remotes[0],
+                    "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none", "--stdin"],
+                   input="\n".join(shas).encode(), capture_output=True)
+
+
+class RepoMap:
+    """
+    Structure of one git tree: per-file language, line count and top-level definitions.
+    Built once per tree sha in a process pool and persisted in the repository git dir.
+    """
+
+    def __init__(self, tree_sha: str, files: List[list]):
+        self.tree_sha = tree_sha
+        self.files = files  # [path, language or None, lines or None, definitions]
+
+    @classmethod
+    def build(cls, repo: Repo, sha: str = None, max_workers: int = None) -> "RepoMap":
+        index = get_path_index(repo, sha)
+        entries = [(path, blob_sha) for path, blob_sha in zip(index.paths, index.blob_shas) if language_of(path)]
+        files = [[path, None, None, []] for path in index.paths if not language_of(path)]
+
+        if is_partial_clone(repo):
+            present = dict(zip(index.blob_shas, index.blob_sizes(repo)))
+            _prefetch_blobs(repo, sorted({blob_sha for _, blob_sha in entries if present.get(blob_sha) is None}))
+        sizes = _object_sizes(repo.git_dir, [blob_sha for _, blob_sha in entries]) if entries else {}
+
+        batches = _batches(entries, sizes)
+        if len(entries) < MIN_FILES_FOR_POOL or len(batches) == 1:
+            for batch in batches:
+                files += _analyze_batch(repo.git_dir, batch)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+                for result in executor.map(_analyze_batch, [repo.git_dir] * len(batches), batches):
+                    files += result
+        files.sort(key=lambda file: file[0])
+        return cls(index.tree_sha, files)
+
+    def save(self, file_path: str):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"tree": self.tree_sha, "files": self.files}, f)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "RepoMap":
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["tree"], data["files"])
+
+    def render(self, directory: str = "", max_depth: int = 2, max_chars: int = 12_000) -> str:
+        """
+        Compact text summary: totals, language breakdown, line counts per directory down to max_depth,
+        then top-level definitions per file until max_chars is reached.
+        """
+        prefix = directory.strip("/") + "/" if directory.strip("/") else ""
+        files = [file for file in self.files if file[0].startswith(prefix)]
+        if not files:
+            return f"No file under '{directory}'."
+
+        total_lines = sum(file[2] or 0 for file in files)
+        languages = defaultdict(lambda: [0, 0])
+        directories = defaultdict(lambda: [0, 0])
+        for path, language, lines, _ in files:
+            languages[language or "Other"][0] += 1
+            languages[language or "Other"][1] += lines or 0
+            parts = path[len(prefix):].split("/")[:-1]
+            for depth in range(1, min(len(parts), max_depth) + 1):
+                directories[prefix + "/".join(parts[:depth]) + "/"][0] += 1
+                directories[prefix + "/".join(parts[:depth]) + "/"][1] += lines or 0
+
+        output = [f"{len(files)} files, {total_lines} lines" + (f" under {prefix}" if prefix else "")]
+        output.append("Languages: " + ", ".join(
+            f"{language} {lines * 100 // max(total_lines, 1)}% ({count} files, {lines} lines)"
+            for language, (count, lines) in sorted(languages.items(), key=lambda item: (-item[1][1], -item[1][0]))))
+        output.append("Directories:")
+        for path, (count, lines) in sorted(directories.items()):
+            output.append(f"{'  ' * (path[len(prefix):].count('/'))}{path} {count} files, {lines} lines")
+        output.append("Top-level definitions:")
+        size = sum(len(line) + 1 for line in output)
+        for path, _, _, definitions in files:
+            if not definitions:
+                continue
+            line = f"  {path}: {', '.join(definitions)}"
+            if size + len(line) > max_chars:
+                output.append("  [... truncated, call get_repo_map with a directory for more ...]")
+                break
+            output.append(line)
+            size += len(line) + 1
+        return "\n".join(output)
+
+
+_memory_cache: "OrderedDict[tuple, RepoMap]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_repo_map(repo: Repo, sha: str = None) -> RepoMap:
+    """
+    Returns the RepoMap of a commit (HEAD by default), from memory, from disk, or built once.
+    """
+    tree_sha = repo.commit(sha).tree.hexsha if sha else repo.head.commit.tree.hexsha
+    key = (repo.git_dir, tree_sha)
+    with _lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    file_path = os.path.join(repo.git_dir, "agent-cache", "repomap", f"{tree_sha}.json")
+    if os.path.exists(file_path):
+        repo_map = RepoMap.load(file_path)
+    else:
+        repo_map = RepoMap.build(repo, sha)
+        repo_map.save(file_path)
+
+    with _lock:
+        _memory_cache[key] = repo_map
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return repo_map
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+from git import Repo
+from git.exc import BadName, BadObject, GitCommandError
+
+from Clients.read_only_git_client import ReadOnlyGitClient
+
+# Lookup errors leave the handle usable, anything else may have interrupted a cat-file exchange
+RECOVERABLE_ERRORS = (KeyError, ValueError, IndexError, BadName, BadObject, GitCommandError)
+
+
+class RepoPool:
+    """
+    Process-wide pool of open git.Repo handles, keyed by repository path.
+
+    Opening a Repo spawns persistent `git cat-file` helpers, so handles are kept open and reused.
+    A handle is leased to one caller at a time (GitPython handles are not thread-safe),
+    concurrent sessions on the same clone get separate handles.
+    Idle handles are closed after idle_timeout seconds, and the least recently used ones
+    are evicted when more than max_handles are open.
+    """
+
+    def __init__(self, max_handles: int = 16, idle_timeout: float = 300):
+        self.max_handles = max_handles
+        self.idle_timeout = idle_timeout
+        self._idle: "OrderedDict[tuple, tuple]" = OrderedDict()  # (path, id(repo)) -> (repo, released_at), LRU first
+        self._leased = 0
+        self._lock = threading.Lock()
+        self._janitor = None
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.realpath(path)
+
+    @contextmanager
+    def client(self, repo_path: str) -> Iterator[ReadOnlyGitClient]:
+        """
+        Leases a ReadOnlyGitClient on a pooled handle, drop-in for `with ReadOnlyGitClient(repo_path)`.
+        """
+        path = self._key(repo_path)
+        repo = self._acquire(path)
+        try:
+            yield ReadOnlyGitClient.from_repo(repo)
+        except RECOVERABLE_ERRORS:
+            self._release(path, repo)
+            raise
+        except BaseException:
+            self._discard_leased(repo)
+            raise
+        self._release(path, repo)
+
+    def _acquire(self, path: str) -> Repo:
+        with self._lock:
+            self._sweep()
+            for key in reversed(self._idle):
+                if key[0] == path:
+                    repo, _ = self._idle.pop(key)
+                    self._leased += 1
+                    return repo
+            self._leased += 1
+        try:
+            return Repo(path)
+        except Exception:
+            with self._lock:
+                self._leased -= 1
+            raise
+
+    def _release(self, path: str, repo: Repo):
+        with self._lock:
+            self._leased -= 1
+            self._idle[(path, id(repo))] = (repo, time.monotonic())
+            self._sweep()
+            self._start_janitor()
+
+    def _discard_leased(self, repo: Repo):
+        with self._lock:
+            self._leased -= 1
+        repo.close()
+
+    def _sweep(self):
+        """Closes expired idle handles, then the least recently used ones while over capacity. Lock held."""
+        now = time.monotonic()
+        for key in [k for k, (_, released_at) in self._idle.items() if now - released_at > self.idle_timeout]:
+            self._idle.pop(key)[0].close()
+        while self._idle and len(self._idle) + self._leased > self.max_handles:
+            self._idle.popitem(last=False)[1][0].close()
+
+    def _start_janitor(self):
+        if self._janitor is None or not self._janitor.is_alive():
+            self._janitor = threading.Thread(target=self._janitor_loop, daemon=True)
+            self._janitor.start()
+
+    def _janitor_loop(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            with self._lock:
+                self._sweep()
+                if not self._idle:
+                    self._janitor = None
+                    return
+
+    def discard(self, repo_path: str):
+        """Closes the idle handles of a repository, e.g. before it is deleted or recloned."""
+        path = self._key(repo_path)
+        with self._lock:
+            for key in [k for k in self._idle if k[0] == path]:
+                self._idle.pop(key)[0].close()
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.popitem()[1][0].close()
+
+
+default_pool = RepoPool()
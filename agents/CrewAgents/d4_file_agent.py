@@ -4,21 +4,28 @@ import core.sqlite_patch as sqlite_patch
 from agents.CrewAgents.crew_agent import CrewAIAgent
 
 import os
+import uuid
 
 
 from typing import List
 from crewai.tools import tool
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
+from core.retrieval.embeddings import get_embeddings
+from core.retrieval.disk_index import SQLiteDocstore, build_disk_vector_store
 
 from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
+from core.retrieval.qa import DocumentQA
+from core.retrieval.keyword_index import KeywordIndex, HybridRetriever
 
 
 class DocumentAnalysisAgent(CrewAIAgent):
-    def __init__(self, model: str = "gemini/gemini-1.5-flash-002"):
+    def __init__(self, model: str = "gemini/gemini-1.5-flash-002", embedding_backend: str = None,
+                 embedding_batch_size: int = 64, embedding_concurrency: int = 4,
+                 vector_index: str = "memory", max_index_memory_mb: float = 256,
+                 top_k: int = 4, max_context_chars: int = 12000, chain_type: str = "stuff",
+                 qa_concurrency: int = 4, retrieval_mode: str = "auto"):
         self.role = "AI assistant specialized in document analysis"
         self.goal = ("To extract, summarize, and analyze content from documents provided by the user."
                      )
@@ -26,6 +33,31 @@ class DocumentAnalysisAgent(CrewAIAgent):
                              " otherwise, answer based on conversational context.")
         self.backstory = "Expert in understanding and processing PDFs and other document formats."
 
+        # "google" by default, "hashing" runs fully offline on CPU
+        self.embeddings = get_embeddings(
+            embedding_backend or os.getenv("EMBEDDING_BACKEND", "google"),
+            batch_size=embedding_batch_size,
+            max_concurrency=embedding_concurrency,
+        )
+
+        # "memory" keeps the flat FAISS index and chunk texts in RAM,
+        # "disk" compresses the index and keeps chunk texts in SQLite under a per-session memory cap
+        self.vector_index = vector_index
+        self.max_index_memory_mb = max_index_memory_mb
+        self.index_memory_used = 0
+        self.session_id = str(uuid.uuid4())
+
+        # The LLM client and the per-document retriever and QA pipeline are built once, then reused
+        self.top_k = top_k
+        self.max_context_chars = max_context_chars
+        self.chain_type = chain_type
+        self.qa_concurrency = qa_concurrency
+
+        # "auto" answers keyword-heavy queries (clause numbers, SKUs, names) from BM25 without embedding them
+        self.retrieval_mode = retrieval_mode
+        self.llm = None
+        self.documents = {}
+
         super().__init__(model)
 
 
@@ -50,33 +82,79 @@ class DocumentAnalysisAgent(CrewAIAgent):
         filename: nom du PDF (ex. 'doc.pdf').
         """
         try:
-            
-            # Adds the document name to the root of the project
-            base = os.getcwd()
-            upload_dir = os.path.join(base, "temp_uploads")
-            abs_path = os.path.join(upload_dir, filename)
-
-            if not os.path.isfile(abs_path):
-                raise FileNotFoundError(f"[STEP {step}] Fichier non trouvé : {abs_path}")
-            
-            loader = PyPDFLoader(abs_path)
-            docs = loader.load()
-            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-            chunks = splitter.split_documents(docs)
-
-            embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-            db = FAISS.from_documents(chunks, embeddings)
-
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-002")
-
-            step = 6
-            qa = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=db.as_retriever()
-            )
-            return qa.run(query)
+            return self._get_document_qa(filename).run(query)
 
         except Exception as e:
             msg = f"Error in document analysis : {type(e).__name__} : {e}"
             raise RuntimeError(msg)
+
+    def _get_llm(self) -> ChatGoogleGenerativeAI:
+        """The LLM client is created once and shared by every document of the agent."""
+        if self.llm is None:
+            self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-002")
+        return self.llm
+
+    def _get_document_qa(self, filename: str) -> DocumentQA:
+        """
+        Returns the QA pipeline of a document, ingesting it only on first use
+        or when the uploaded file changed.
+        """
+        # Adds the document name to the root of the project
+        abs_path = os.path.join(os.getcwd(), "temp_uploads", filename)
+        if not os.path.isfile(abs_path):
+            raise FileNotFoundError(f"Fichier non trouvé : {abs_path}")
+
+        stat = os.stat(abs_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self.documents.get(abs_path)
+        if cached and cached["version"] == version:
+            return cached["qa"]
+        if cached:
+            self.index_memory_used -= getattr(cached["db"], "index_memory_bytes", 0)
+            # The new store reopens the same SQLite file, the old connection would leak
+            del self.documents[abs_path]
+            if isinstance(cached["db"].docstore, SQLiteDocstore):
+                cached["db"].docstore.close()
+
+        loader = PyPDFLoader(abs_path)
+        docs = loader.load()
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        chunks = splitter.split_documents(docs)
+        for chunk_id, chunk in enumerate(chunks):
+            chunk.metadata["chunk_id"] = chunk_id
+
+        db = self._build_vector_store(filename, chunks)
+        print(f"[{self.embeddings.backend.name} embeddings] {self.embeddings.stats}")
+
+        keyword_index = KeywordIndex([chunk.page_content for chunk in chunks])
+        if self.vector_index == "disk":
+            # Chunk texts stay in the SQLite docstore, ids are the chunk positions
+            get_chunk = lambda chunk_id: db.docstore.search(str(chunk_id))
+        else:
+            get_chunk = chunks.__getitem__
+        retriever = HybridRetriever(keyword_index=keyword_index, vector_store=db, get_chunk=get_chunk,
+                                    k=self.top_k, mode=self.retrieval_mode)
+
+        qa = DocumentQA(
+            self._get_llm(),
+            retriever,
+            chain_type=self.chain_type,
+            max_context_chars=self.max_context_chars,
+            max_concurrency=self.qa_concurrency,
+        )
+        self.documents[abs_path] = {"version": version, "db": db, "qa": qa}
+        return qa
+
+    def _build_vector_store(self, filename: str, chunks: List) -> FAISS:
+        """
+        Builds the vector store of a document, in RAM or on disk depending on self.vector_index.
+        """
+        if self.vector_index != "disk":
+            return FAISS.from_documents(chunks, self.embeddings)
+
+        storage_dir = os.path.join(os.getcwd(), "temp_uploads", "indexes", self.session_id,
+                                   os.path.splitext(filename)[0])
+        remaining_mb = self.max_index_memory_mb - self.index_memory_used / 2**20
+        db = build_disk_vector_store(chunks, self.embeddings, storage_dir, max_memory_mb=remaining_mb)
+        self.index_memory_used += db.index_memory_bytes
+        return db
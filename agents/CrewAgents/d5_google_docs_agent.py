@@ -4,15 +4,16 @@ from agents.CrewAgents.crew_agent import CrewAIAgent
 
 import os
 import uuid
+import bisect
+import itertools
+import threading
 
 from datetime import datetime, timezone
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from crewai import Agent, Task, Crew
-from dotenv import load_dotenv
-from typing import List
+from Clients.google_discovery_cache import build_service
+from typing import Iterator, List
 from crewai.tools import tool
 
 
@@ -21,45 +22,128 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive.file"
 ]
 
+# Keeps each insertText and each batchUpdate well under the Docs API payload limits
+MAX_INSERT_CHARS = 50_000
+MAX_BATCH_CHARS = 500_000
+
+# Credentials are refreshed in the background this many seconds before they expire
+REFRESH_MARGIN = 300
+
 class GoogleDocsAgent(CrewAIAgent):
-    def __init__(self, model="gemini/gemini-1.5-flash-002"):
+    def __init__(self, model="gemini/gemini-1.5-flash-002", docs_service=None, drive_service=None):
 
         self.session_id = str(uuid.uuid4())
+        # One document per session, only messages after synced_messages are sent on the next save,
+        # synced_chars of the next one are already in the document when a save stopped halfway
+        self.doc_id = None
+        self.synced_messages = 0
+        self.synced_chars = 0
+
+        # Google services are only built on the first Docs operation, so construction never blocks on OAuth
+        self._docs_service = docs_service
+        self._drive_service = drive_service
+        self._credentials = None
+        self._refresh_timer = None
+        self._services_lock = threading.Lock()
         super().__init__(model)
-        self._init_google_services()
 
-        self.tools = self._create_tools()  
-        self.crew = Crew(agents=[self.agent], tasks=[self.task], verbose=False)
+    @property
+    def docs_service(self):
+        if self._docs_service is None:
+            self._init_google_services()
+        return self._docs_service
+
+    @property
+    def drive_service(self):
+        if self._drive_service is None:
+            self._init_google_services()
+        return self._drive_service
 
     def _init_google_services(self):
         """Initialise docs_service et drive_service avec OAuth2."""
-        creds = None
-        if os.path.exists("token.json"):
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-                creds = flow.run_local_server(port=0)
-            with open("token.json", "w") as token:
-                token.write(creds.to_json())
-        self.docs_service = build("docs", "v1", credentials=creds) 
-        self.drive_service = build("drive", "v3", credentials=creds)
+        with self._services_lock:
+            if self._credentials is None:
+                creds = None
+                if os.path.exists("token.json"):
+                    creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+                if not creds or not creds.valid:
+                    if creds and creds.expired and creds.refresh_token:
+                        creds.refresh(Request())
+                    else:
+                        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+                        creds = flow.run_local_server(port=0)
+                    self._save_credentials(creds)
+                self._credentials = creds
+                self._schedule_refresh()
+            if self._docs_service is None:
+                self._docs_service = build_service("docs", "v1", self._credentials)
+            if self._drive_service is None:
+                self._drive_service = build_service("drive", "v3", self._credentials)
+
+    @staticmethod
+    def _save_credentials(creds: Credentials):
+        with open("token.json", "w") as token:
+            token.write(creds.to_json())
+
+    def _schedule_refresh(self):
+        """Refreshes the credentials in a daemon thread shortly before they expire."""
+        creds = self._credentials
+        if not creds or not creds.refresh_token or not creds.expiry:
+            return
+        # google-auth stores expiry as a naive UTC datetime
+        expires_in = (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+        self._refresh_timer = threading.Timer(max(0, expires_in - REFRESH_MARGIN), self._refresh_credentials)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh_credentials(self):
+        try:
+            self._credentials.refresh(Request())
+            self._save_credentials(self._credentials)
+        except Exception as e:
+            # The next API call will refresh on demand
+            print(f"Background Google credentials refresh failed: {e}")
+            return
+        self._schedule_refresh()
 
     def _create_tools(self) -> List:
         @tool("save_conversation")
         def save_conv_tool() -> str:
-            doc = self._create_doc()
-            self._insert_conversation(doc_id=doc["documentId"])
-            return f"Conversation saved to Google Docs (ID: {doc['documentId']})"
+            """
+            Save the conversation to the Google Docs document of this session.
+            Only the messages added since the last save are appended.
+            """
+            return self.save_conversation()
         return [save_conv_tool]
 
     def chat(self, message: str) -> str:
         if message.strip().lower() == "save conversation as document":
-            return self.tools[0]()  
+            return self.save_conversation()
         return super().chat(message)
 
+    def clear_chat(self) -> bool:
+        self.synced_messages = 0
+        self.synced_chars = 0
+        return super().clear_chat()
+
+    def save_conversation(self) -> str:
+        """
+        Creates the session document on first save, then appends the new messages.
+        The cursor advances after each batchUpdate, so a save retried after a failure resumes where it stopped.
+        """
+        if self.doc_id is None:
+            self.doc_id = self._create_doc()["documentId"]
+        lines = [f"{msg['role'].upper()}: {msg['content']}\n" for msg in self.messages[self.synced_messages:]]
+        # starts[i]: position of message i in the pending text, starts[-1]: its length
+        starts = list(itertools.accumulate(map(len, lines), initial=0))
+        first_message, first_char = self.synced_messages, self.synced_chars
+        for written in self._append_text(self.doc_id, "".join(lines)[first_char:]):
+            position = first_char + written
+            message = bisect.bisect_right(starts, position) - 1
+            self.synced_messages = first_message + message
+            self.synced_chars = position - starts[message]
+        return f"Conversation saved to Google Docs (ID: {self.doc_id}, {len(lines)} new messages)"
+
     def _create_doc(self) -> dict:
         """Crée un document vierge dans Drive."""
         
@@ -67,25 +151,32 @@ class GoogleDocsAgent(CrewAIAgent):
         doc = self.docs_service.documents().create(body=body).execute()  
         return doc
 
-    def _insert_conversation(self, doc_id: str):
-        """Insère toute la conversation en un seul batchUpdate."""
-
-        requests = []
-        index = 1
-        for msg in self.messages:
-            text = f"{msg['role'].upper()}: {msg['content']}\n"
-            requests.append({
-                "insertText": {
-                    "location": {"index": index},
-                    "text": text
-                }
-            })
-            index += len(text) 
-
-        self.docs_service.documents().batchUpdate(
-            documentId=doc_id,
-            body={"requests": requests}
-        ).execute() 
+    def _append_text(self, doc_id: str, text: str) -> Iterator[int]:
+        """
+        Appends text at the end of the document body, as one insert per segment
+        of at most MAX_INSERT_CHARS, grouped in batchUpdates of at most MAX_BATCH_CHARS.
+        Yields the number of characters written after each batchUpdate.
+        """
+        segments = [text[i:i + MAX_INSERT_CHARS] for i in range(0, len(text), MAX_INSERT_CHARS)]
+
+        batches, batch, batch_size = [], [], 0
+        for segment in segments:
+            if batch and batch_size + len(segment) > MAX_BATCH_CHARS:
+                batches.append(batch)
+                batch, batch_size = [], 0
+            batch.append({"insertText": {"endOfSegmentLocation": {}, "text": segment}})
+            batch_size += len(segment)
+        if batch:
+            batches.append(batch)
+
+        written = 0
+        for requests in batches:
+            self.docs_service.documents().batchUpdate(
+                documentId=doc_id,
+                body={"requests": requests}
+            ).execute()
+            written += sum(len(request["insertText"]["text"]) for request in requests)
+            yield written
 
     def list_saved_docs(self, folder_id: str, page_size: int = 10):
         """Exemple: liste les fichiers dans un dossier Drive."""
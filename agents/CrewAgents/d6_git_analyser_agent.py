@@ -1,4 +1,8 @@
 from Clients.read_only_git_client import ReadOnlyGitClient
+from Clients.repo_pool import default_pool
+from Clients.background_fetch import fetch_in_background, update_hooks
+from Clients.commit_index import update_commit_index
+from Clients.multi_repo import analyze_repositories, format_report
 from agents.CrewAgents.crew_agent import CrewAIAgent
 
 import re
@@ -7,13 +11,22 @@ import os
 from typing import List
 from crewai.tools import tool
 
+# Index the fetched commits right after each background update
+if update_commit_index not in update_hooks:
+    update_hooks.append(update_commit_index)
+
 class GitRepoAnalysisAgent(CrewAIAgent):
-    def __init__(self, model: str = "gemini/gemini-1.5-flash-002"):
+    def __init__(self, model: str = "gemini/gemini-1.5-flash-002", clone_mode: str = "blobless",
+                 clone_depth: int = None):
         self.role = "Git Repository Analyst"
         self.goal = "Analyze the history, structure, and content of a Git repository."
         self.instructions = "Use dedicated Git tools to accurately answer queries."
         self.backstory = "Expert in code exploration of Public Git repos."
 
+        # Partial clones answer the first questions without downloading the whole history
+        self.clone_mode = clone_mode
+        self.clone_depth = clone_depth
+
         super().__init__(model)
 
         self.local_repo = "temp_uploads"
@@ -24,19 +37,35 @@ class GitRepoAnalysisAgent(CrewAIAgent):
         def clone_repo_tool(repo_url: str) -> str:
             """
             Clone a remote repository into the temp_uploads directory.
+            If it was already cloned, the existing clone is updated in the background.
             Input: repo_url (str).
             Output: cloned local path (str).
             """
             name = self.get_repo_name(repo_url)
             local_path = f"temp_uploads/{name}"
             
-            if not os.path.exists(local_path):
-                os.makedirs(local_path, exist_ok=True)
-                client = ReadOnlyGitClient(repo_url, local_path)
-            else:
-                return f"There is already a clone in current repo, use repo_path ={local_path} to access it"
+            if os.path.isdir(os.path.join(local_path, ".git")):
+                fetch_in_background(local_path)
+                return (f"There is already a clone, it is being updated in the background, "
+                        f"use repo_path ={local_path} to access it")
+
+            os.makedirs(local_path, exist_ok=True)
+            with ReadOnlyGitClient(repo_url, local_path, clone_mode=self.clone_mode, depth=self.clone_depth) as client:
+                working_dir = client.repo.working_dir
             
-            return f"Cloned to {client.repo.working_dir}"
+            return f"Cloned to {working_dir}"
+
+        @tool("analyze_repositories")
+        def analyze_repositories_tool(repo_urls: List[str], since_days: int = 30) -> str:
+            """
+            Compare or summarize several repositories at once: commits, contributors, churn and last activity.
+            Repositories are cloned or updated into temp_uploads and analyzed in parallel.
+            Input: repo_urls (list of str) urls or local paths, since_days (int, optional) activity window.
+            Output: one line per repository and the totals (str).
+            """
+            report = analyze_repositories(repo_urls, workdir="temp_uploads", clone_mode=self.clone_mode,
+                                          since_days=since_days)
+            return format_report(report)
 
         @tool("list_branches")
         def list_branches_tool(repo_path: str, remote: bool = False) -> str:
@@ -45,7 +74,7 @@ class GitRepoAnalysisAgent(CrewAIAgent):
             Input: repo_path (str), remote (bool).
             Output: list of branches (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
+            with default_pool.client(repo_path) as client:
                 branches = client.list_branches(remote=remote)
             return "\n".join(branches)
 
@@ -56,7 +85,7 @@ class GitRepoAnalysisAgent(CrewAIAgent):
             Input: repo_path (str).
             Output: list of tags (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
+            with default_pool.client(repo_path) as client:
                 return "\n".join(client.list_tags())
 
         @tool("list_commits")
@@ -66,10 +95,45 @@ class GitRepoAnalysisAgent(CrewAIAgent):
             Input: repo_path (str), branch (str, optional), max_count (int, optional).
             Output: list of commit SHAs (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
+            with default_pool.client(repo_path) as client:
                 commits = client.list_commits(branch=branch, max_count=max_count)
             return "\n".join(commits)
 
+        @tool("search_commits")
+        def search_commits_tool(repo_path: str, author: str = None, since: str = None, until: str = None,
+                                path: str = None, text: str = None, limit: int = 20) -> str:
+            """
+            Search the commit history, e.g. "who changed X last month" or "commits touching path Y".
+            Input: repo_path (str), author (str, optional) name or e-mail substring,
+            since (str, optional) and until (str, optional) ISO dates such as '2024-05-01',
+            path (str, optional) file or directory, text (str, optional) substring of the commit message,
+            limit (int, optional).
+            Output: one commit per line, most recent first: sha, date, author, files changed, +added -removed, subject (str).
+            """
+            with default_pool.client(repo_path) as client:
+                commits = client.search_commits(author=author, since=since, until=until, path=path, text=text,
+                                                limit=limit)
+            if not commits:
+                return "No commit found."
+            return "\n".join(
+                f"{c['sha'][:10]} {c['date']} {c['author']} ({c['files']} files"
+                + (f", +{c['added']} -{c['removed']}" if c['added'] is not None else "")
+                + f") {c['subject']}"
+                for c in commits
+            )
+
+        @tool("get_commit_files")
+        def get_commit_files_tool(repo_path: str, sha: str) -> str:
+            """
+            List the files touched by a commit, with added and removed line counts.
+            Input: repo_path (str), sha (str).
+            Output: one file per line (str).
+            """
+            with default_pool.client(repo_path) as client:
+                files = client.get_commit_files(sha)
+            return "\n".join(f"{f['path']}" + (f" +{f['added']} -{f['removed']}" if f['added'] is not None else "")
+                             for f in files) or "No file changed."
+
         @tool("get_latest_commit")
         def get_latest_commit_tool(repo_path: str, branch: str = 'main') -> str:
             """
@@ -77,70 +141,149 @@ class GitRepoAnalysisAgent(CrewAIAgent):
             Input: repo_path (str), branch (str, optional).
             Output: SHA (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
+            with default_pool.client(repo_path) as client:
                 return client.get_latest_commit(branch=branch)
 
         @tool("get_file_contents")
-        def get_file_contents_tool(repo_path: str, filepath: str, sha: str = None) -> str:
+        def get_file_contents_tool(repo_path: str, filepath: str, sha: str = None, start_line: int = None,
+                                   end_line: int = None) -> str:
             """
-            Read the contents of a file at a given commit.
-            Input: repo_path (str), filepath (str), sha (str, optional).
+            Read the contents of a file at a given commit, or only a range of lines.
+            Binary files are summarized (type and size), very large files return their first lines.
+            Input: repo_path (str), filepath (str), sha (str, optional),
+            start_line (int, optional) and end_line (int, optional), 1-based and included.
             Output: file contents (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
-                return client.get_file_contents(filepath, sha)
+            with default_pool.client(repo_path) as client:
+                return client.get_file_contents(filepath, sha, start_line, end_line)
+
+        @tool("get_diff_summary")
+        def get_diff_summary_tool(repo_path: str, sha1: str, sha2: str, paths: List[str] = None) -> str:
+            """
+            Get the diffstat between two commits: changed files with added/removed line counts.
+            Call this first, then get_diff on the files you need.
+            Input: repo_path (str), sha1 (str), sha2 (str), paths (list of str, optional) to filter files.
+            Output: diffstat (str).
+            """
+            with default_pool.client(repo_path) as client:
+                return client.get_diff_summary(sha1, sha2, paths)
 
         @tool("get_diff")
-        def get_diff_tool(repo_path: str, sha1: str, sha2: str) -> str:
+        def get_diff_tool(repo_path: str, sha1: str, sha2: str, paths: List[str] = None, offset: int = 0,
+                          max_tokens: int = 4000) -> str:
             """
-            Get the diff between two commits.
-            Input: repo_path (str), sha1 (str), sha2 (str)
-            Output: diff (str).
+            Get one page of the diff between two commits, file by file.
+            Input: repo_path (str), sha1 (str), sha2 (str), paths (list of str, optional) to filter files,
+            offset (int, optional) index of the first file of the page, max_tokens (int, optional) page size.
+            Output: diff (str), ending with the offset of the next page when there are more files.
             """
-            with ReadOnlyGitClient(repo_path) as client:
-                return client.get_diff(sha1, sha2)
+            with default_pool.client(repo_path) as client:
+                return client.get_diff(sha1, sha2, paths, offset=offset, max_tokens=max_tokens)
 
         @tool("search_files")
-        def search_files_tool(repo_path: str, pattern: str, sha: str = None) -> str:
+        def search_files_tool(repo_path: str, pattern: str, sha: str = None, glob: bool = False,
+                              directory: str = "") -> str:
             """
-            Search files by regex pattern.
-            Input: repo_path (str), pattern (str), sha (str, optional).
+            Search files by regex pattern, or by shell glob (e.g. '*.py') when glob is True.
+            Input: repo_path (str), pattern (str), sha (str, optional), glob (bool, optional),
+            directory (str, optional) to restrict the search.
             Output: list of matching files (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
-                files = client.search_files(pattern, sha)
+            with default_pool.client(repo_path) as client:
+                files = client.search_files(pattern, sha, glob=glob, directory=directory)
             return "\n".join(files)
 
+        @tool("grep")
+        def grep_tool(repo_path: str, pattern: str, sha: str = None, paths: List[str] = None,
+                      ignore_case: bool = False, fixed_string: bool = False, context: int = 0,
+                      max_matches: int = 50) -> str:
+            """
+            Search file contents at a commit, e.g. to find where a symbol is defined or used.
+            Binary and very large files are skipped.
+            Input: repo_path (str), pattern (str, extended regex), sha (str, optional),
+            paths (list of str, optional) pathspecs such as 'src/' or '*.py', ignore_case (bool, optional),
+            fixed_string (bool, optional) to search the pattern literally, context (int, optional) lines around
+            each match, max_matches (int, optional).
+            Output: matches as path:line: text (str).
+            """
+            with default_pool.client(repo_path) as client:
+                matches = client.grep(pattern, sha, paths, ignore_case=ignore_case, fixed_string=fixed_string,
+                                      context=context, max_matches=max_matches)
+            if not matches:
+                return "No match."
+            lines = []
+            for match in matches:
+                if match["context"]:
+                    lines += [f"{match['path']}:{n}{':' if n == match['line'] else '-'} {text}"
+                              for n, text in match["context"]] + ["--"]
+                else:
+                    lines.append(f"{match['path']}:{match['line']}: {match['text']}")
+            if len(matches) >= max_matches:
+                lines.append(f"[... stopped at {max_matches} matches, narrow the pattern or the paths ...]")
+            return "\n".join(lines)
+
+        @tool("get_repo_map")
+        def get_repo_map_tool(repo_path: str, sha: str = None, directory: str = "", max_tokens: int = 3000) -> str:
+            """
+            Overview of the repository structure: languages, line counts per directory and the top-level
+            classes and functions of each file. Call this first to understand a repository,
+            before get_tree or get_file_contents.
+            Input: repo_path (str), sha (str, optional), directory (str, optional) to zoom in,
+            max_tokens (int, optional).
+            Output: repository map (str).
+            """
+            with default_pool.client(repo_path) as client:
+                return client.get_repo_map(sha, directory, max_tokens=max_tokens)
+
         @tool("get_tree")
-        def get_tree_tool(repo_path: str, sha: str = None) -> str:
+        def get_tree_tool(repo_path: str, sha: str = None, directory: str = "") -> str:
             """
-            List all files at a given commit.
-            Input: repo_path (str), sha (str, optional).
+            List all files at a given commit, optionally only under a directory.
+            Input: repo_path (str), sha (str, optional), directory (str, optional).
             Output: list of files (str).
             """
-            with ReadOnlyGitClient(repo_path) as client:
-                return "\n".join(client.get_tree(sha))
+            with default_pool.client(repo_path) as client:
+                return "\n".join(client.get_tree(sha, directory))
+
+        @tool("list_directory")
+        def list_directory_tool(repo_path: str, directory: str = "", sha: str = None) -> str:
+            """
+            List the immediate children of a directory, with the number of files in each sub-directory.
+            Input: repo_path (str), directory (str, optional, root by default), sha (str, optional).
+            Output: one entry per line (str).
+            """
+            with default_pool.client(repo_path) as client:
+                children = client.list_directory(directory, sha)
+            return "\n".join(f"{name} ({count} files)" if name.endswith("/") else name
+                             for name, count in sorted(children.items()))
 
         @tool("get_last_diff")
         def get_last_diff_tool(repo_path: str, branch: str="main") -> str:
             """
-            Get the the diff from the last commit
+            Get the diffstat and the first page of the diff from the last commit
             Inputs:  branch (str, optional).
             Output: last diffs (str)
             """
-            with ReadOnlyGitClient(repo_path) as client:
+            with default_pool.client(repo_path) as client:
                 return client.get_last_diff(branch)
 
         return [
             clone_repo_tool,
+            analyze_repositories_tool,
             list_branches_tool,
             list_tags_tool,
             list_commits_tool,
+            search_commits_tool,
+            get_commit_files_tool,
             get_latest_commit_tool,
             get_file_contents_tool,
+            get_diff_summary_tool,
             get_diff_tool,
             search_files_tool,
+            grep_tool,
+            get_repo_map_tool,
             get_tree_tool,
+            list_directory_tool,
             get_last_diff_tool
         ]
     def get_repo_name(self, url: str)-> str:
@@ -1,30 +1,25 @@
 from typing import List
 from crewai.tools import tool
-from agents.CrewAgents.crew_agent import CrewAIAgent
-from core.script_engine.script import Script
-from core.script_engine.step import Step
-from core.script_engine.validator import Range, Regex
+from agents.CrewAgents.scripted_agent import ScriptedAgent
+from core.pricing import pool_price
+from core.script_engine.loader import get_script as load_script
 
 
-class PoolQuotationAgent(CrewAIAgent):
-    def __init__(self, model="gemini/gemini-2.0-flash-lite"):
+class PoolQuotationAgent(ScriptedAgent):
+    def __init__(self, model="gemini/gemini-2.0-flash-lite", local_steps: bool = True):
         self.role = "Pool price estimator"
         self.goal = "To calculate the estimated price for a pool based on its dimensions."
         self.knowledge = (
             "You are a pool price estimator. You calculate the price based on the length and width of the pool "
         )
-        super().__init__(model)
+        super().__init__(model, local_steps=local_steps)
 
     def get_script(self):
         """
-        Defines the steps of the script for the pool quote process.
+        The pool quote steps, defined in config/scripts.json.
         """
-        return Script(steps=[
-            Step("What is the length of your pool (in meters)?", "length", float, validators=[Range(1, 15)]),
-            Step("What is the width of your pool (in meters)?", "width", float, validators=[Range(1, 10)]),
-            Step("Please provide your email address:", "email", str, validators=[Regex(r".+@.+\..+")]),
-        ])
-    
+        return load_script("pool_quotation")
+
 
     def _create_tools(self) -> List:
         @tool("calculate_price")
@@ -41,7 +36,15 @@ class PoolQuotationAgent(CrewAIAgent):
             """
             return self._calculate_pool_price(length, width)
 
-        return [price_calculation_tool]
+        return super()._create_tools() + [price_calculation_tool]
+
+    def on_script_complete(self, values: dict) -> str:
+        """
+        Quotes the price as soon as every value is collected, without calling the LLM.
+        """
+        price = self._calculate_pool_price(values["length"], values["width"])
+        return (f"The estimated price of a {values['length']} x {values['width']} m pool is {price:,.2f} €. "
+                f"A detailed quote will be sent to {values['email']}. Feel free to ask any question.")
 
     def _calculate_pool_price(self, length: float, width: float) -> float:
         """
@@ -55,4 +58,4 @@ class PoolQuotationAgent(CrewAIAgent):
         - float: the estimated price of the pool.
         """
 
-        return length * width * 520 # I chose a random value but you can implement your own business logic there
+        return pool_price(length, width)
@@ -1,21 +1,129 @@
 import os
-import uuid
-import json
-import requests
-from typing import List
+import re
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from msal import PublicClientApplication
+from msal import PublicClientApplication, SerializableTokenCache
 
 from crewai.tools import tool
 from agents.CrewAgents.crew_agent import CrewAIAgent
+from Clients.outlook_outbox import GRAPH_URL, Outbox, get_outbox
+
+AUTHORITY = "https://login.microsoftonline.com/consumers"
+SCOPES = ["https://graph.microsoft.com/Mail.Send"]
+
+# One MSAL token cache file per user, it holds the refresh token
+TOKEN_DIR = "temp_uploads/outlook_tokens"
+
+# Access tokens are refreshed in the background this many seconds before they expire
+REFRESH_MARGIN = 300
+
+
+class UserTokens:
+    """
+    The PublicClientApplication of one user with its persisted MSAL token cache, shared by every agent of the process.
+    The access token is kept in memory with its expiry, so checking it costs no network call,
+    and a daemon timer refreshes it with the refresh token before it expires.
+    """
+
+    def __init__(self, client_id: str, user_id: str):
+        self.path = os.path.join(TOKEN_DIR, re.sub(r"[^\w.@-]", "_", user_id) + ".json")
+        self.cache = SerializableTokenCache()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.cache.deserialize(f.read())
+        self.app = PublicClientApplication(client_id=client_id, authority=AUTHORITY, token_cache=self.cache)
+        self.access_token = None
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_timer = None
+
+    def token(self) -> Optional[str]:
+        """A valid access token, from memory, else from the cache (MSAL redeems the refresh token if needed)."""
+        if self.access_token and time.time() < self.expires_at - 60:
+            return self.access_token
+        return self._acquire_silent()
+
+    def refresh(self) -> Optional[str]:
+        """
+        Drops the in-memory token and redeems the refresh token, e.g. after Graph refused the token (401).
+        Returns None, and token() too, when the user has to log in again.
+        """
+        with self._lock:
+            self.access_token = None
+            self.expires_at = 0.0
+        try:
+            return self._acquire_silent(force_refresh=True)
+        except Exception as e:
+            print(f"Outlook token refresh failed: {e}")
+            return None
+
+    def _acquire_silent(self, force_refresh: bool = False) -> Optional[str]:
+        accounts = self.app.get_accounts()
+        if not accounts:
+            return None
+        result = self.app.acquire_token_silent(SCOPES, account=accounts[0], force_refresh=force_refresh)
+        if not result or "access_token" not in result:
+            return None
+        return self.use(result)
+
+    def use(self, result: dict) -> str:
+        """Keeps the token of an MSAL result, persists the cache and schedules the next refresh."""
+        with self._lock:
+            self.access_token = result["access_token"]
+            self.expires_at = time.time() + int(result.get("expires_in", 0))
+            self._save_cache()
+            self._schedule_refresh()
+        return self.access_token
+
+    def _save_cache(self):
+        if not self.cache.has_state_changed:
+            return
+        os.makedirs(TOKEN_DIR, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.cache.serialize())
+        os.replace(tmp, self.path)
+        self.cache.has_state_changed = False
+
+    def _schedule_refresh(self):
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+        delay = max(0, self.expires_at - time.time() - REFRESH_MARGIN)
+        self._refresh_timer = threading.Timer(delay, self._refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh(self):
+        try:
+            if self._acquire_silent(force_refresh=True) is None:
+                print("Outlook token refresh failed, the user will have to log in again")
+        except Exception as e:
+            # The next token check retries on demand
+            print(f"Background Outlook token refresh failed: {e}")
+
+
+_user_tokens: Dict[Tuple[str, str], UserTokens] = {}
+_user_tokens_lock = threading.Lock()
+
+
+def get_user_tokens(client_id: str, user_id: str) -> UserTokens:
+    with _user_tokens_lock:
+        if (client_id, user_id) not in _user_tokens:
+            _user_tokens[(client_id, user_id)] = UserTokens(client_id, user_id)
+        return _user_tokens[(client_id, user_id)]
 
 
 class OutlookAgent(CrewAIAgent):
-    def __init__(self, model="gemini/gemini-2.0-flash-lite"):
+    def __init__(self, model="gemini/gemini-2.0-flash-lite", user_id: str = None, graph_url: str = GRAPH_URL):
         load_dotenv()
         os.makedirs("temp_uploads", exist_ok=True)
-        self.token_file = "temp_uploads/outlook_token.json"
+        # Tokens are cached per user, the Outlook address entered in the sidebar when there is one
+        self.user_id = user_id or os.getenv("OUTLOOK_USER_ID") or "default"
+        # Emails are queued and sent in the background, graph_url can point to Clients.fake_graph_server
+        self.graph_url = graph_url
         self.access_token = None
         self.device_flow_data = None
         self.chat_instantiation = True
@@ -26,49 +134,37 @@ class OutlookAgent(CrewAIAgent):
         super().__init__(model)
         self.tools = self._create_tools()
 
-    def is_identified(self) -> bool:
-        if self.access_token:
-            return True
-        token = self._load_token()
-        if token:
-            self.access_token = token
-            return True
-        return False
-
-    def _load_token(self):
-        if os.path.exists(self.token_file):
-            with open(self.token_file, "r") as f:
-                data = json.load(f)
-            return data.get("access_token")
-        return None
-
-    def _save_token(self, token):
-        with open(self.token_file, "w") as f:
-            json.dump({"access_token": token}, f)
-
-    def _start_auth_flow(self) -> str:
+    @property
+    def tokens(self) -> UserTokens:
         msa_client_id = os.getenv("MSA_CLIENT_ID")
         if not msa_client_id:
             raise ValueError("Missing MSA_CLIENT_ID in environment")
+        return get_user_tokens(msa_client_id, self.user_id)
+
+    @property
+    def outbox(self) -> Outbox:
+        tokens = self.tokens
+        return get_outbox(self.user_id, tokens.token, self.graph_url, refresh_token=tokens.refresh)
+
+    def is_identified(self) -> bool:
+        if not os.getenv("MSA_CLIENT_ID"):
+            return False
+        self.access_token = self.tokens.token()
+        return self.access_token is not None
 
-        app = PublicClientApplication(
-            client_id=msa_client_id,
-            authority="https://login.microsoftonline.com/consumers"
-        )
-        self.device_flow_data = app.initiate_device_flow(scopes=["https://graph.microsoft.com/Mail.Send"])
+    def _start_auth_flow(self) -> str:
+        self.device_flow_data = self.tokens.app.initiate_device_flow(scopes=SCOPES)
         if "user_code" not in self.device_flow_data:
             raise Exception(f"Device flow failed: {self.device_flow_data.get('error_description', 'Unknown error')}")
-        self.app = app
         print (self.device_flow_data["message"])
         return self.device_flow_data["message"]
 
     def _complete_auth_flow(self) -> bool:
-        if not self.device_flow_data or not self.app:
+        if not self.device_flow_data:
             raise Exception("Authentication flow not started. Call `start_authentication` first.")
-        result = self.app.acquire_token_by_device_flow(self.device_flow_data)
+        result = self.tokens.app.acquire_token_by_device_flow(self.device_flow_data)
         if "access_token" in result:
-            self.access_token = result["access_token"]
-            self._save_token(self.access_token)
+            self.access_token = self.tokens.use(result)
             return True
         raise Exception(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
 
@@ -91,6 +187,7 @@ class OutlookAgent(CrewAIAgent):
         def send_email_tool(subject: str, body: str, recipients: List[str]) -> str:
             """
             Sends an email via the connected Outlook account.
+            The email is queued and sent in the background, the returned tracking id can be checked with `email_status`.
 
             ⚠️ Please run `complete_authentication()` before using this tool.
             If it returns False, use `start_authentication` and `complete_authentication` first.
@@ -98,31 +195,28 @@ class OutlookAgent(CrewAIAgent):
             if not self.is_identified():
                 return "❗ Not authenticated. Please run  `complete_authentication`."
 
-            url = "https://graph.microsoft.com/v1.0/me/sendMail"
-            payload = {
-                "message": {
-                    "subject": subject,
-                    "body": {"contentType": "Text", "content": body},
-                    "toRecipients": [{"emailAddress": {"address": addr}} for addr in recipients]
-                },
-                "saveToSentItems": True
-            }
-
-            response = requests.post(
-                url,
-                headers={
-                    "Authorization": f"Bearer {self.access_token}",
-                    "Content-Type": "application/json"
-                },
-                json=payload
-            )
-
-            if response.status_code == 202:
-                return f"📨 Email sent to: {', '.join(recipients)}"
-            else:
-                return f"❌ Failed: {response.status_code} - {response.text}"
-
-        return [complete_auth_tool, send_email_tool]
+            tracking_id = self.outbox.enqueue(subject, body, recipients)
+            return f"📨 Email to {', '.join(recipients)} queued for sending, tracking id: {tracking_id}"
+
+        @tool("email_status")
+        def email_status_tool(tracking_id: str) -> str:
+            """
+            Tells whether a queued email was sent.
+            Input: the tracking id returned by `send_personal_email`.
+            Output: queued, sent or failed, with the last error.
+            """
+            status = self.outbox.status(tracking_id.strip())
+            if status is None:
+                return f"❌ Unknown tracking id: {tracking_id}"
+            if status["status"] == "sent":
+                return "✅ Sent."
+            if status["status"] == "failed":
+                return f"❌ Failed: {status['error']}"
+            if status["error"]:
+                return f"⏳ Queued, last attempt: {status['error']}"
+            return "⏳ Queued."
+
+        return [complete_auth_tool, send_email_tool, email_status_tool]
     
     def chat(self, prompt):
         if self.chat_instantiation:
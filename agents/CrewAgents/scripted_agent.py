@@ -1,14 +1,23 @@
-from crewai import CrewAIAgent
+from agents.CrewAgents.crew_agent import CrewAIAgent
 from crewai.tools import tool
 from core.script_engine.script import Script
+from core.script_engine.step import Step
 from abc import ABC, abstractmethod
+from typing import Optional
 
 class ScriptedAgent(CrewAIAgent, ABC):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, model="gemini/gemini-2.0-flash-lite", local_steps: bool = True):
+        """
+        local_steps=True: the script engine answers while steps remain, parsing and validating locally.
+        The LLM is only called to extract a value from a free-form answer, and for the open chat afterwards.
+        local_steps=False: the LLM drives the script through the assign_value/next_step tools.
+        """
         self.script = self.get_script()
+        self.local_steps = local_steps
+        self.llm_calls = 0
+        self._prompted = False
+        super().__init__(model)
         self.goal = "Collect each user input in order, then transition to open conversation."
-        self.tools = self._create_tools()
 
     @abstractmethod
     def get_script(self) -> Script:
@@ -18,6 +27,9 @@ class ScriptedAgent(CrewAIAgent, ABC):
         raise NotImplementedError
 
     def _create_tools(self):
+        if self.local_steps:
+            return []
+
         @tool
         def assign_value(value: str) -> str:
             """
@@ -56,8 +68,14 @@ class ScriptedAgent(CrewAIAgent, ABC):
 
     @property
     def instructions(self) -> str:
+        if self.local_steps:
+            return (
+                "You are a scripted assistant. The scripted questions have already been asked and answered, "
+                "the collected values are in the conversation history. "
+                "Answer the user's questions using them."
+            )
         return (
-            "You are a scripted assistant.\n" 
+            "You are a scripted assistant.\n"
             "On the first chat with the user always call next_step() to learn the first instructions"
             "On each turn:\n"
             "1. Call next_step() to retrieve and pose the next question (beginning with the first step).\n"
@@ -66,3 +84,87 @@ class ScriptedAgent(CrewAIAgent, ABC):
             "When next_step() returns “🎉 All inputs collected. Resume free chat.”, "
             "resume open‐domain conversation without using these tools."
         )
+
+    @instructions.setter
+    def instructions(self, value: str):
+        # CrewAIAgent sets generic instructions, the scripted ones above always apply
+        pass
+
+    def chat(self, message: str) -> str:
+        """
+        While steps remain in local mode, the reply comes from the script engine, without calling the crew.
+        """
+        if not self.local_steps or self.script.current_step() is None:
+            return super().chat(message)
+
+        reply = self._scripted_reply(message)
+        self.messages.append({"role": "user", "content": message})
+        self.messages.append({"role": "assistant", "content": reply})
+        return reply
+
+    def _scripted_reply(self, message: str) -> str:
+        """
+        Fills every step the message answers, e.g. "12 by 5 meters, mail me at a@b.com" fills three steps at once.
+        """
+        step = self.script.current_step()
+        added, errors = self.script.fill(message)
+        if not added and not errors:
+            if not self._prompted:
+                # The first message is usually a greeting, it only gets the first question
+                self._prompted = True
+                return step.prompt
+            # Nothing recognized, e.g. "about twelve meters": ask the LLM for the bare value
+            value = self._extract_with_llm(step, message)
+            if value is None:
+                return f"❌ Expected a {step.type_.__name__}.\n{step.prompt}"
+            added, errors = self.script.fill(value)
+            if not added and not errors:
+                return f"{self.script.assign(value)}\n{self.script.next_prompt()}"
+
+        self._prompted = True
+        closing = self.on_script_complete(self.script.values) if self.script.current_step() is None else None
+        return self.script.report(added, errors, closing)
+
+    def _extract_with_llm(self, step: Step, message: str) -> Optional[str]:
+        """
+        Fallback extractor: one short LLM call returning only the value of the current step, or None.
+        """
+        try:
+            self.llm_calls += 1
+            answer = self.agent.llm.call([
+                {"role": "system", "content": (
+                    f"Extract the answer to the question \"{step.prompt}\" from the user's message, "
+                    f"as a {step.type_.__name__}. Reply with the value only, or NONE if it is not given."
+                )},
+                {"role": "user", "content": message},
+            ])
+        except Exception as e:
+            print(f"LLM extraction failed: {e}")
+            return None
+        answer = str(answer).strip().strip('"\'`')
+        return None if not answer or answer.upper() == "NONE" else answer
+
+    def on_script_complete(self, values: dict) -> str:
+        """
+        Message sent once every step is filled, override it to act on the values locally.
+        """
+        return self.script.next_prompt()
+
+    def save_state(self) -> dict:
+        """
+        JSON-serializable progress of the script, to store between requests.
+        """
+        return {**self.script.state(), "prompted": self._prompted}
+
+    def resume(self, state: dict):
+        """
+        Restores the progress saved by save_state(), possibly on another worker.
+        """
+        self.script = self.get_script()
+        self.script.values = dict(state.get("values", {}))
+        self._prompted = state.get("prompted", True)
+
+    def clear_chat(self) -> bool:
+        self.script = self.get_script()
+        self._prompted = False
+        return super().clear_chat()
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from typing import List, Tuple
+
+from agents.Custom.d8_custom_agent import STOP_SEQUENCES, CustomAgent
+from agents.Custom.sandbox import get_default_pool
+from agents.Custom.stub_model import StubModel
+
+PROMPT = ("Please schedule a meeting with John, Sarah, and Michael for the 02/11/2024 at 2pm "
+          "to discuss the Q2 marketing strategy and tell me if I should bring anything.")
+
+
+async def run_sessions(sessions: int, latency: float) -> float:
+    """Wall-clock seconds for `sessions` concurrent chats on one event loop, each with its own stub model."""
+    agents = [CustomAgent(genai_model=StubModel(latency=latency)) for _ in range(sessions)]
+    started = time.perf_counter()
+    await asyncio.gather(*(agent.chat(PROMPT) for agent in agents))
+    return time.perf_counter() - started
+
+
+async def context_growth(steps: int = 30, observation_chars: int = 2000) -> list:
+    """Prompt tokens sent at each step of one long chat whose every step prints a large observation."""
+    step = (f"Thought: I need more data.\n\nCode:\nprint('x' * {observation_chars})\nEnd code")
+    agent = CustomAgent(genai_model=StubModel([step], latency=0), max_llm_calls=steps)
+    await agent.chat(PROMPT)
+    return agent.step_tokens
+
+
+async def sandbox_overhead(runs: int = 50) -> Tuple[float, float]:
+    """Mean milliseconds to execute a one-tool snippet in-process and in a pre-started sandbox worker."""
+    code = "schedule_meeting(['John'], '2024-11-02', '14:00', 'Q2')\nresult = 1"
+    timings = []
+    for use_sandbox in (False, True):
+        agent = CustomAgent(genai_model=StubModel(), use_sandbox=use_sandbox)
+        await agent.execute_code(code)  # warm-up, starts the workers
+        started = time.perf_counter()
+        for _ in range(runs):
+            await agent.execute_code(code)
+        timings.append((time.perf_counter() - started) * 1000 / runs)
+    return timings[0], timings[1]
+
+
+async def output_savings(latency: float = 0.2, chunk_latency: float = 0.01) -> List[Tuple[str, float, float]]:
+    """
+    Characters generated per step and seconds per chat for a model that runs on past its code,
+    without stop sequences nor streaming, with each of them, and with both.
+    """
+    configs = [
+        ("no stop, no stream", None, False, True),
+        ("stop sequences", STOP_SEQUENCES, False, True),
+        ("stream parser, stop ignored", STOP_SEQUENCES, True, False),
+        ("stop sequences + stream", STOP_SEQUENCES, True, True),
+    ]
+    rows = []
+    for name, stop_sequences, stream, honour_stop in configs:
+        model = StubModel(latency=latency, chunk_latency=chunk_latency, hallucinate=True, honour_stop=honour_stop)
+        agent = CustomAgent(genai_model=model, stop_sequences=stop_sequences, stream=stream)
+        started = time.perf_counter()
+        await agent.chat(PROMPT)
+        seconds = time.perf_counter() - started
+        rows.append((name, model.generated_chars / len(model.prompts), seconds))
+    return rows
+
+
+async def main(latency: float = 0.2, max_sessions: int = 32):
+    """
+    With non-blocking model calls the wall time stays close to one session (steps x latency)
+    as sessions are added, instead of growing linearly.
+    The prompt tokens per step stop growing once the context budget is reached.
+    Stop sequences and the streaming parser end each step at its code instead of an invented observation.
+    """
+    get_default_pool().start()
+    print(f"model latency {latency}s, 2 steps per chat")
+    sessions = 1
+    while sessions <= max_sessions:
+        seconds = await run_sessions(sessions, latency)
+        print(f"{sessions:3d} sessions: {seconds:.3f}s wall, {sessions / seconds:.1f} chats/s")
+        sessions *= 2
+
+    in_process, sandboxed = await sandbox_overhead()
+    print(f"code execution: {in_process:.2f} ms in-process, {sandboxed:.2f} ms in a sandbox worker")
+
+    print(f"output per step ({latency}s to first chunk, 10 ms per 16 chars):")
+    for name, chars, seconds in await output_savings(latency):
+        print(f"  {name:28s} {chars:6.0f} chars (~{chars / 4:.0f} tokens), {seconds:.3f}s per chat")
+
+    tokens = await context_growth()
+    print(f"prompt tokens per step (system instruction sent once, not counted): {tokens}, total {sum(tokens)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,27 +3,136 @@ import re
 import io
 import sys
 import asyncio
+import threading
 import google.generativeai as genai
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from agents.Custom.sandbox import SandboxPool, get_default_pool
+
+# Code runs off the event loop, tool calls started with parallel() get their own pool
+_code_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="custom-agent-code")
+_tool_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="custom-agent-tool")
+
+# Context sent at each step: about 3k tokens of conversation on top of the system instruction
+MAX_CONTEXT_CHARS = 12_000
+KEEP_RECENT_TURNS = 4
+OLD_OBSERVATION_CHARS = 300
+
+# Generation stops at the end of the code block instead of running on into an invented observation
+STOP_SEQUENCES = ["End code", "\nObservation:"]
+
+
+class _StepParser:
+    """
+    Accumulates a streamed model reply and tells when a complete Thought/Code block has arrived,
+    so the stream can be cut before the model writes an observation and further steps itself.
+    """
+
+    CODE_BODY = r'Code:\s*(?:```(?:py|python)?\s*)?(\S.*?)'
+    COMPLETE = re.compile(CODE_BODY + r'(?:\s*```|/End code|\nEnd code|\nObservation:)', re.DOTALL)
+    OPEN = re.compile(r'Code:\s*(?:```(?:py|python)?\s*)?\S', re.DOTALL)
+
+    def __init__(self):
+        self.text = ""
+        self.match = None
+
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk, returns True once the code block is closed"""
+        self.text += chunk
+        self.match = self.COMPLETE.search(self.text)
+        return self.match is not None
+
+    def result(self) -> str:
+        """
+        The reply up to the end of its code, always closed with 'End code': the stop sequence itself
+        is not part of the generated text, and a stream cut early may end on another terminator.
+        """
+        if self.match:
+            return self.text[:self.match.end(1)] + "\nEnd code"
+        if self.OPEN.search(self.text):
+            return self.text.rstrip() + "\nEnd code"
+        return self.text
+
+
+class _ThreadLocalStdout(io.TextIOBase):
+    """
+    sys.stdout replacement: print() goes to the buffer captured by the current thread, if any,
+    so concurrent executions don't clobber each other's output.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def current(self) -> Optional[io.StringIO]:
+        return getattr(self._local, "buffer", None)
+
+    def write(self, text: str) -> int:
+        return (self.current() or self.default).write(text)
+
+    def flush(self):
+        (self.current() or self.default).flush()
+
+    @contextmanager
+    def capture(self, buffer: io.StringIO):
+        previous = self.current()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = previous
+
+
+def _thread_local_stdout() -> _ThreadLocalStdout:
+    if not isinstance(sys.stdout, _ThreadLocalStdout):
+        sys.stdout = _ThreadLocalStdout(sys.stdout)
+    return sys.stdout
+
 
 class CustomAgent:
-    def __init__(self, model="gemini-1.5-flash-002", max_llm_calls=10):
+    def __init__(self, model="gemini-1.5-flash-002", max_llm_calls=10, genai_model=None,
+                 max_context_chars=MAX_CONTEXT_CHARS, sandbox: Optional[SandboxPool] = None, use_sandbox=True,
+                 stop_sequences: Optional[List[str]] = STOP_SEQUENCES, stream=True):
+        """
+        genai_model: any object with generate_content_async(contents), e.g. stub_model.StubModel for benchmarks.
+        It must carry the system instruction itself (see build_system_instruction).
+        max_context_chars: budget of the conversation sent at each step, older observations are truncated
+        then older steps dropped past it.
+        sandbox: worker pool running the generated code (the shared default pool if None),
+        use_sandbox=False runs it in-process as before.
+        stop_sequences: passed in the generation config, None lets the model run on.
+        stream: reads the reply as it is generated and stops reading once its code block is complete.
+        """
         self.model = model
         self.MAX_LLM_CALLS = max_llm_calls
-        
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise EnvironmentError("Please set GEMINI_API_KEY in your environment variables or .env file")
-        genai.configure(api_key=api_key)
-        
-        self.genai_model = genai.GenerativeModel(self.model)
-        self.chat_session = self.genai_model.start_chat(history=[])
-        
+        self.max_context_chars = max_context_chars
+        self.use_sandbox = use_sandbox
+        self.sandbox = (sandbox or get_default_pool()) if use_sandbox else None
+        self.stream = stream
+        self.generation_config = {"stop_sequences": list(stop_sequences)} if stop_sequences else None
+
         self.tools = self.create_tools()
         self.tool_descriptions = self.get_tool_descriptions()
-    
+        self.system_instruction = self.build_system_instruction()
+
+        if genai_model is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise EnvironmentError("Please set GEMINI_API_KEY in your environment variables or .env file")
+            genai.configure(api_key=api_key)
+            # Sent once as a stable prefix, not repeated in every prompt
+            genai_model = genai.GenerativeModel(self.model, system_instruction=self.system_instruction)
+        self.genai_model = genai_model
+
+        # Conversation as Gemini contents: alternating user / model turns
+        self.history: List[Dict[str, Any]] = []
+        self.step_tokens: List[int] = []
+        self.step_output_chars: List[int] = []
+
     def create_tools(self) -> List[Dict[str, Any]]:
         """Lists available tools"""
         return [
@@ -37,7 +146,9 @@ class CustomAgent:
 
     def clear_chat(self) -> bool:
         """Clears chat history"""
-        self.chat_session = self.genai_model.start_chat(history=[])
+        self.history = []
+        self.step_tokens = []
+        self.step_output_chars = []
         return True
 
     def get_tool_descriptions(self) -> str:
@@ -52,10 +163,8 @@ class CustomAgent:
             descriptions.append(desc)
         return "\n".join(descriptions)
 
-    async def agent_loop(self, prompt: str) -> str:
-        """Main chat loop"""
-        
-        system_instructions = f"""You have access to:<tool_descriptions>
+    def build_system_instruction(self) -> str:
+        return f"""You have access to:<tool_descriptions>
         {self.tool_descriptions}
         </tool_descriptions>
 
@@ -64,6 +173,7 @@ class CustomAgent:
         At each step, in the 'Thought:' sequence, you should first explain your reasoning towards solving the task, then the tools that you want to use.
         Then in the 'Code:' sequence, you should write CLEAN Python code without any additional prefixes or syntax markers. Just pure Python code. The code sequence must end with 'End code' sequence.
         During each intermediate step, you can use 'print()' to save whatever important information you will then need.
+        Independent tool calls can run concurrently: results = parallel(lambda: tool_a(...), lambda: tool_b(...)).
         These print outputs will then be available in the 'Observation:' field, for using this information as input for the next step.
 
         In the end you have to return a final answer using the `final_answer` tool.
@@ -73,16 +183,77 @@ class CustomAgent:
         IMPORTANT: When writing code, DO NOT include any prefix like 'python' or 'py' at the beginning of your code. Just write clean Python code directly.
         """
 
-        full_prompt = f"{system_instructions}\n\nUser request: {prompt}"
+    def _add_turn(self, role: str, text: str):
+        """Appends to the history, merging consecutive turns of the same role."""
+        if self.history and self.history[-1]["role"] == role:
+            self.history[-1]["parts"].append(text)
+        else:
+            self.history.append({"role": role, "parts": [text]})
+
+    def _context(self) -> List[Dict[str, Any]]:
+        """
+        The history to send, within max_context_chars: the last KEEP_RECENT_TURNS turns are kept as is,
+        older observations are cut to OLD_OBSERVATION_CHARS, then turns are dropped: first those of the
+        previous requests, then the oldest steps of the current one. The turn holding the current
+        "User request:" is always kept, so the model never loses its task.
+        The prompt size per step therefore stops growing once the budget is reached.
+        """
+        turns = []
+        for position, turn in enumerate(self.history):
+            parts = list(turn["parts"])
+            if position < len(self.history) - KEEP_RECENT_TURNS:
+                parts = [part[:OLD_OBSERVATION_CHARS] + " [... truncated]"
+                         if part.startswith("Observation:") and len(part) > OLD_OBSERVATION_CHARS else part
+                         for part in parts]
+            turns.append({"role": turn["role"], "parts": parts})
+        if not turns:
+            return turns
+
+        request = max((position for position, turn in enumerate(turns)
+                       if any(part.startswith("User request:") for part in turn["parts"])), default=0)
+        recent = max(request + 1, len(turns) - KEEP_RECENT_TURNS)
+        before, steps = turns[:request], turns[request + 1:recent]
+
+        size = sum(len(part) for turn in turns for part in turn["parts"])
+        dropped_before = dropped_steps = 0
+        while before and size > self.max_context_chars:
+            size -= sum(len(part) for part in before.pop(0)["parts"])
+            dropped_before += 1
+        # The conversation must start with a user turn
+        while before and before[0]["role"] != "user":
+            before.pop(0)
+            dropped_before += 1
+        while steps and size > self.max_context_chars:
+            size -= sum(len(part) for part in steps.pop(0)["parts"])
+            dropped_steps += 1
+
+        if dropped_before:
+            first = before[0] if before else turns[request]
+            first["parts"].insert(0, f"[{dropped_before} earlier messages omitted]")
+        if dropped_steps:
+            turns[request]["parts"].append(f"[{dropped_steps} earlier messages of this request omitted]")
+
+        # Dropping steps can leave two turns of the same role next to each other, they are merged
+        context = []
+        for turn in before + [turns[request]] + steps + turns[recent:]:
+            if context and context[-1]["role"] == turn["role"]:
+                context[-1]["parts"].extend(turn["parts"])
+            else:
+                context.append(turn)
+        return context
+
+    async def agent_loop(self, prompt: str) -> str:
+        """Main chat loop, each step only adds its own thought, code and observation to the history"""
+
+        self._add_turn("user", f"User request: {prompt}")
 
         final_response = ""
         llm_call_count = 0
-        current_context = full_prompt
-        
+
         while llm_call_count < self.MAX_LLM_CALLS:
             llm_call_count += 1
 
-            model_response = await self.call_llm(current_context)
+            model_response = await self.call_llm(self._context())
 
             thought, code, remainder = self.extract_response_parts(model_response)
             
@@ -91,18 +262,67 @@ class CustomAgent:
             
             observation = await self.execute_code(code)
             final_response += f"Observation: {observation}\n\n"
-            
-            current_context = f"{current_context}\n\nThought: {thought}\n\nCode:\n{code}\nEnd code\n\nObservation: {observation}\n\nContinue with next step:"
-            
+
+            self._add_turn("model", f"Thought: {thought}\n\nCode:\n{code}\nEnd code")
+            self._add_turn("user", f"Observation: {observation}")
+
             if "final_answer" in code:
                 break
+            self._add_turn("user", "Continue with next step:")
         
         return final_response
 
-    async def call_llm(self, prompt: str) -> str:
-        """Generate content from gemini API"""
-        response = self.genai_model.generate_content(prompt)
-        return response.text
+    async def call_llm(self, contents: List[Dict[str, Any]]) -> str:
+        """
+        Generate content from gemini API, without blocking the event loop, and record the prompt tokens
+        and the characters received. When streaming, reading stops as soon as a full Thought/Code block is in.
+        """
+        response = await self.genai_model.generate_content_async(
+            contents, generation_config=self.generation_config, stream=self.stream)
+        parser = _StepParser()
+        prompt_tokens = None
+        if self.stream:
+            chunks = response.__aiter__()
+            try:
+                async for chunk in chunks:
+                    prompt_tokens = prompt_tokens or self._prompt_tokens(chunk)
+                    if parser.feed(self._chunk_text(chunk)):
+                        break
+            finally:
+                await self._close_stream(response, chunks)
+        else:
+            prompt_tokens = self._prompt_tokens(response)
+            parser.feed(response.text)
+
+        if prompt_tokens:
+            self.step_tokens.append(prompt_tokens)
+        else:
+            self.step_tokens.append(sum(len(part) for turn in contents for part in turn["parts"]) // 4)
+        self.step_output_chars.append(len(parser.text))
+        return parser.result()
+
+    @staticmethod
+    async def _close_stream(response, chunks):
+        """Closes a stream left before its end, so the rest of the reply is neither generated nor kept open"""
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+        # The genai response wraps the gRPC call, cancelling it ends generation on the server
+        call = getattr(response, "_iterator", None)
+        if hasattr(call, "cancel"):
+            call.cancel()
+
+    @staticmethod
+    def _prompt_tokens(response) -> Optional[int]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "prompt_token_count", None) or None
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of a streamed chunk, the last chunks may only carry the finish reason"""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
 
     def extract_response_parts(self, response: str) -> Tuple[str, str, str]:
         """Extracts the Thoughts and Code parts of the response"""
@@ -134,36 +354,71 @@ class CustomAgent:
         return thought, code, remainder
 
     async def execute_code(self, code: str) -> str:
-        """Executes the python code"""
+        """
+        Executes the python code in a sandbox worker process (or in-process without sandbox),
+        waiting from a thread so the event loop keeps serving other sessions
+        """
+        loop = asyncio.get_running_loop()
+        if self.use_sandbox:
+            return await loop.run_in_executor(_code_executor, self.sandbox.execute, code, self._sandbox_tools(),
+                                              self._run_tool)
+        return await loop.run_in_executor(_code_executor, self._run_code, code)
 
+    def _sandbox_tools(self) -> Dict[str, Callable]:
+        """The only functions the sandboxed code can call, they run here in the agent process"""
+        return {
+            "schedule_meeting": self.schedule_meeting,
+            "final_answer": self.final_answer,
+            "input": self.mock_input,
+        }
+
+    @staticmethod
+    def _run_tool(tool: Callable, args: tuple, kwargs: dict) -> Tuple[Any, str]:
+        """Runs a tool called from the sandbox and captures its prints for the observation"""
+        with _thread_local_stdout().capture(io.StringIO()) as output:
+            value = tool(*args, **kwargs)
+        return value, output.getvalue()
+
+    def _run_code(self, code: str) -> str:
         locals_dict = {
             "schedule_meeting": self.schedule_meeting,
             "final_answer": self.final_answer,
+            "parallel": self.parallel,
             "input": self.mock_input,
             "result": None
         }
 
-        old_stdout = sys.stdout
-        redirected_output = io.StringIO()
-        sys.stdout = redirected_output
-        
-        try:
-            code = code.strip()
-            
-            # Executing code, I implemented this method because it is a simple use case, if you plan on using this agent
-            # for more complex uses cases (which I DON'T recomand, it is a demo agent), you will need to restrict access
-            exec(code, globals(), locals_dict)
-            output = redirected_output.getvalue()
-            
-            if locals_dict.get("result") is not None:
-                output += f"\nResult: {locals_dict['result']}"
-            
-            return output.strip() if output.strip() else "No output"
-        except Exception as e:
-            return f"Error: {type(e).__name__}: {str(e)}"
-        finally:
-            sys.stdout = old_stdout
-    
+        with _thread_local_stdout().capture(io.StringIO()) as redirected_output:
+            try:
+                code = code.strip()
+
+                # Executing code, I implemented this method because it is a simple use case, if you plan on using this agent
+                # for more complex uses cases (which I DON'T recomand, it is a demo agent), you will need to restrict access
+                # One namespace for globals and locals, so functions and lambdas defined by the code see the tools
+                exec(code, locals_dict)
+                output = redirected_output.getvalue()
+
+                if locals_dict.get("result") is not None:
+                    output += f"\nResult: {locals_dict['result']}"
+
+                return output.strip() if output.strip() else "No output"
+            except Exception as e:
+                return f"Error: {type(e).__name__}: {str(e)}"
+
+    def parallel(self, *calls: Callable) -> List[Any]:
+        """
+        Runs independent tool calls concurrently and returns their results in order.
+        Their prints go to the observation of the calling code.
+        """
+        stdout = _thread_local_stdout()
+        buffer = stdout.current()
+
+        def run(call: Callable):
+            with stdout.capture(buffer):
+                return call()
+
+        return list(_tool_executor.map(run, calls))
+
     def mock_input(self, prompt=""):
         """For demo purpose"""
         print(f"[Input prompt: {prompt}]")
@@ -0,0 +1,271 @@
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource  # not available on Windows, the limits are then wall-clock only
+except ImportError:
+    resource = None
+
+# Tool calls requested by the workers run in the parent, where the tools and their state live
+_tool_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="sandbox-tool")
+
+RunTool = Callable[[Callable, tuple, dict], Tuple[Any, str]]
+
+
+def _run_tool(tool: Callable, args: tuple, kwargs: dict) -> Tuple[Any, str]:
+    return tool(*args, **kwargs), ""
+
+
+def _address_space_bytes() -> int:
+    """Current virtual memory size of the process (Linux), 0 when unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class _WorkerSide:
+    """
+    Runs inside a worker process: a reader thread dispatches the messages of the parent,
+    jobs to the main thread and tool results to the waiting tool proxies.
+    """
+
+    def __init__(self, conn, cpu_seconds: float, memory_mb: int):
+        self.conn = conn
+        self.cpu_seconds = cpu_seconds
+        self.send_lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.pending: Dict[int, list] = {}
+        self.ids = itertools.count()
+        if resource is not None and memory_mb:
+            # The forked image is already mapped, the limit is on top of it
+            limit = _address_space_bytes() + memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def send(self, message: tuple):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def read(self):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                self.jobs.put(None)
+                return
+            if message[0] == "tool_result":
+                entry = self.pending.pop(message[1])
+                entry[1] = message[2:]
+                entry[0].set()
+            else:
+                self.jobs.put(message)
+
+    def tool_proxy(self, name: str) -> Callable:
+        def call(*args, **kwargs):
+            request_id = next(self.ids)
+            entry = [threading.Event(), None]
+            self.pending[request_id] = entry
+            self.send(("tool", request_id, name, args, kwargs))
+            entry[0].wait()
+            ok, value, printed = entry[1]
+            if printed:
+                print(printed, end="" if printed.endswith("\n") else "\n")
+            if not ok:
+                raise RuntimeError(value)
+            return value
+        call.__name__ = name
+        return call
+
+    @staticmethod
+    def parallel(*calls: Callable) -> List[Any]:
+        """Runs independent tool calls concurrently and returns their results in order."""
+        with ThreadPoolExecutor(max_workers=max(1, len(calls))) as executor:
+            return list(executor.map(lambda call: call(), calls))
+
+    def limit_cpu(self):
+        if resource is None or not self.cpu_seconds:
+            return
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + self.cpu_seconds) + 1
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+    def run(self, code: str, tool_names: List[str]) -> str:
+        namespace = {name: self.tool_proxy(name) for name in tool_names}
+        namespace.update({"parallel": self.parallel, "result": None})
+        buffer = io.StringIO()
+        self.limit_cpu()
+        with redirect_stdout(buffer):
+            try:
+                exec(code.strip(), namespace)
+                output = buffer.getvalue()
+                if namespace.get("result") is not None:
+                    output += f"\nResult: {namespace['result']}"
+                return output.strip() if output.strip() else "No output"
+            except MemoryError:
+                return "Error: MemoryError: the code exceeded the memory limit"
+            except Exception as e:
+                return f"Error: {type(e).__name__}: {str(e)}"
+
+    def loop(self):
+        threading.Thread(target=self.read, daemon=True).start()
+        while True:
+            message = self.jobs.get()
+            if message is None:
+                return
+            _, code, tool_names = message
+            try:
+                output = self.run(code, tool_names)
+            except BaseException:
+                output = f"Error: {traceback.format_exc(limit=1)}"
+            self.send(("done", output))
+
+
+def _worker_main(conn, cpu_seconds: float, memory_mb: int):
+    _WorkerSide(conn, cpu_seconds, memory_mb).loop()
+
+
+class _Worker:
+    def __init__(self, context, cpu_seconds: float, memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, cpu_seconds, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.send_lock = threading.Lock()
+
+    def send(self, message: tuple):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of pre-started worker processes executing untrusted code snippets.
+
+    Each execution gets a fresh namespace, its own stdout, a CPU-time limit, a memory limit and
+    a wall-clock timeout. The code only sees the tools it is given: calling one sends the call
+    to the parent process over a pipe, where the real function runs. Workers are recycled after
+    max_runs executions, and replaced when they crash or time out.
+    Workers come from a fork server where available, so a replacement costs milliseconds, not an interpreter start.
+    """
+
+    def __init__(self, size: int = min(4, os.cpu_count() or 1), max_runs: int = 50, cpu_seconds: float = 5.0, memory_mb: int = 256,
+                 timeout: float = 10.0):
+        self.size = size
+        self.max_runs = max_runs
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Starts the workers ahead of the first execution."""
+        with self._lock:
+            if not self._started:
+                for _ in range(self.size):
+                    self._idle.put(self._new_worker())
+                self._started = True
+
+    def _new_worker(self) -> _Worker:
+        return _Worker(self.context, self.cpu_seconds, self.memory_mb)
+
+    def _release(self, worker: _Worker):
+        if worker.alive() and worker.runs < self.max_runs:
+            self._idle.put(worker)
+            return
+        worker.stop()
+        self._idle.put(self._new_worker())
+
+    def execute(self, code: str, tools: Dict[str, Callable], run_tool: RunTool = _run_tool,
+                timeout: Optional[float] = None) -> str:
+        """
+        Runs code in a worker and returns its observation: stdout, then the `result` variable if set,
+        or the error. Blocking, call it from a thread. run_tool(tool, args, kwargs) returns
+        (value, printed text) and lets the caller capture what the tools print.
+        """
+        self.start()
+        worker = self._idle.get()
+        worker.runs += 1
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            try:
+                worker.send(("exec", code, list(tools)))
+            except (OSError, EOFError):
+                # The worker died while idle, _release replaces it
+                worker.stop()
+                return f"Error: the sandbox worker stopped (exit code {worker.process.exitcode})"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    worker.stop()
+                    return f"Error: TimeoutError: execution exceeded {timeout or self.timeout:g}s"
+                try:
+                    message = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join(1)
+                    if worker.process.exitcode == -getattr(signal, "SIGXCPU", 0):
+                        return f"Error: TimeoutError: execution exceeded {self.cpu_seconds:g}s of CPU time"
+                    return f"Error: the sandbox worker stopped (exit code {worker.process.exitcode})"
+                if message[0] == "done":
+                    return message[1]
+                _, request_id, name, args, kwargs = message
+                _tool_executor.submit(self._call_tool, worker, tools, run_tool, request_id, name, args, kwargs)
+        finally:
+            self._release(worker)
+
+    @staticmethod
+    def _call_tool(worker: _Worker, tools: Dict[str, Callable], run_tool: RunTool, request_id: int, name: str,
+                   args: tuple, kwargs: dict):
+        try:
+            value, printed = run_tool(tools[name], args, kwargs)
+            reply = ("tool_result", request_id, True, value, printed)
+        except Exception as e:
+            reply = ("tool_result", request_id, False, f"{name}: {type(e).__name__}: {e}", "")
+        try:
+            worker.send(reply)
+        except (OSError, ValueError):
+            pass  # the worker was stopped meanwhile
+
+    def close(self):
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get().stop()
+            self._started = False
+
+
+_default_pool: Optional[SandboxPool] = None
+_default_lock = threading.Lock()
+
+
+def get_default_pool() -> SandboxPool:
+    """Process-wide pool shared by the agents, started on first use."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = SandboxPool()
+        return _default_pool
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import List
+
+# Two-step answer to the meeting request of d8_custom_agent.main
+DEFAULT_RESPONSES = [
+    "Thought: I will schedule the meeting with the schedule_meeting tool.\n\n"
+    "Code:\n"
+    "schedule_meeting(attendees=['John', 'Sarah', 'Michael'], date='2024-11-02', time='14:00', "
+    "topic='Q2 marketing strategy')\n"
+    "End code",
+    "Thought: The meeting is scheduled, the tool says to bring a coffee mug.\n\n"
+    "Code:\n"
+    "final_answer('The meeting is scheduled for 2024-11-02 at 14:00, bring your coffee mug.')\n"
+    "End code",
+]
+
+# What a model without stop sequences tends to write after its code: the observation and the next steps
+HALLUCINATED_TAIL = (
+    "\nObservation: Meeting scheduled for 2024-11-02, at 14:00, with attendees: John, Sarah, Michael.\n\n"
+    "Thought: The meeting is scheduled, I can now give the final answer to the user and remind them "
+    "to bring what the tool asked for.\n\n"
+    "Code:\n"
+    "final_answer('The meeting is scheduled for 2024-11-02 at 14:00 with John, Sarah and Michael.')\n"
+    "End code\n"
+    "Observation: The meeting is scheduled for 2024-11-02 at 14:00 with John, Sarah and Michael.\n"
+)
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubStream:
+    """Async iterator over the chunks of a streamed reply, each one arriving after chunk_latency."""
+
+    def __init__(self, model: "StubModel", text: str):
+        self.model = model
+        self.chunks = [text[i:i + model.chunk_chars] for i in range(0, len(text), model.chunk_chars)]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(self.model.chunk_latency)
+                self.model.generated_chars += len(chunk)
+                yield StubResponse(chunk)
+        finally:
+            self.closed = True
+            self.model.open_streams -= 1
+
+
+class StubModel:
+    """
+    Scripted stand-in for genai.GenerativeModel, to measure the agent without network or API key.
+    Replies with the scripted responses in turn, after a fixed latency, and records every prompt.
+    Output costs chunk_latency per chunk_chars characters. Stop sequences of the generation config
+    cut the reply like the API does; honour_stop=False imitates a backend ignoring them.
+    With hallucinate=True every reply runs on past its code with an invented observation and steps.
+    generated_chars counts the characters produced, a streamed reply only produces what is read.
+    """
+
+    def __init__(self, responses: List[str] = None, latency: float = 0.2, chunk_latency: float = 0.0,
+                 chunk_chars: int = 16, hallucinate: bool = False, honour_stop: bool = True):
+        self.responses = responses or DEFAULT_RESPONSES
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunk_chars = chunk_chars
+        self.hallucinate = hallucinate
+        self.honour_stop = honour_stop
+        self.prompts = []
+        self.generated_chars = 0
+        self.open_streams = 0
+
+    def _next(self, prompt, generation_config=None) -> str:
+        self.prompts.append(prompt)
+        text = self.responses[(len(self.prompts) - 1) % len(self.responses)]
+        if self.hallucinate:
+            text += HALLUCINATED_TAIL
+        if self.honour_stop and generation_config:
+            for stop in generation_config.get("stop_sequences", []):
+                if stop in text:
+                    text = text[:text.index(stop)]
+        return text
+
+    def _output_seconds(self, text: str) -> float:
+        return self.chunk_latency * -(-len(text) // self.chunk_chars)
+
+    def generate_content(self, prompt, generation_config=None) -> StubResponse:
+        text = self._next(prompt, generation_config)
+        time.sleep(self.latency + self._output_seconds(text))
+        self.generated_chars += len(text)
+        return StubResponse(text)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream: bool = False):
+        text = self._next(prompt, generation_config)
+        await asyncio.sleep(self.latency)
+        if stream:
+            self.open_streams += 1
+            return StubStream(self, text)
+        await asyncio.sleep(self._output_seconds(text))
+        self.generated_chars += len(text)
+        return StubResponse(text)
@@ -27,6 +27,8 @@ def handle_api_keys_input():
             help="Enter your Outlook email address"
         )
         if outlook_email:
-            st.session_state.api_keys["OUTLLOK_USER_ID"] = outlook_email
+            st.session_state.api_keys["OutlookEmail"] = outlook_email
+            # The Outlook agent keeps one token cache per address
+            os.environ["OUTLOOK_USER_ID"] = outlook_email
             st.success("Outlook email address saved ✓")
 
@@ -0,0 +1,9 @@
+# Price per square meter of pool, arbitrary: implement your own business logic here
+POOL_PRICE_PER_SQUARE_METER = 520
+
+
+def pool_price(length, width):
+    """
+    Estimated price of a pool. Works on floats and, element-wise, on NumPy arrays.
+    """
+    return length * width * POOL_PRICE_PER_SQUARE_METER
@@ -0,0 +1,247 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# faiss k-means needs about 39 training points per centroid
+POINTS_PER_CENTROID = 39
+# 8 bit PQ codes: every sub-quantizer learns 256 centroids
+PQ_CENTROIDS = 256
+MIN_NLIST = 16
+# Below this many chunks an index type cannot be trained properly, a flat index is used instead
+MIN_TRAINING_POINTS = {
+    "ivf_sq8": POINTS_PER_CENTROID * MIN_NLIST,
+    "ivf_pq": POINTS_PER_CENTROID * PQ_CENTROIDS,
+}
+# Larger collections are trained on a random sample of this size
+MAX_TRAINING_POINTS = 65_536
+EMBEDDING_BLOCK = 2048
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    LangChain docstore keeping chunk texts in a SQLite file instead of a Python dict,
+    only the chunks returned by a search are loaded in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT, metadata TEXT)")
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, content, metadata) VALUES (?, ?, ?)",
+                [(_id, doc.page_content, json.dumps(doc.metadata)) for _id, doc in texts.items()],
+            )
+
+    def search(self, search: str):
+        with self._lock:
+            row = self.conn.execute("SELECT content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def delete(self, ids: List) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(_id,) for _id in ids])
+
+    def close(self):
+        self.conn.close()
+
+
+def estimate_index_bytes(index_type: str, n: int, dim: int, nlist: int = 0, pq_m: int = 0) -> int:
+    """
+    Approximate resident size of a faiss index, vectors plus ids plus centroids.
+    """
+    if index_type == "flat":
+        return n * dim * 4
+    centroids = nlist * dim * 4
+    if index_type == "ivf_sq8":
+        return centroids + n * (dim + 8)
+    return centroids + n * (pq_m + 8) + 256 * dim * 4
+
+
+def choose_index(n: int, dim: int, max_memory_bytes: int, index_type: str = "auto") -> dict:
+    """
+    Picks the most accurate index that fits in max_memory_bytes.
+    Order of preference: flat, IVF with 8 bit scalar quantization, IVF-PQ with the largest code that fits.
+
+    Returns:
+        dict: {"type", "nlist", "pq_m", "bytes"}
+    """
+    # The coarse quantizer is trained on the same sample, nlist must stay within its k-means budget
+    nlist = max(1, min(int(4 * math.sqrt(n)), training_points(n) // POINTS_PER_CENTROID))
+    candidates = [{"type": "flat", "nlist": 0, "pq_m": 0}]
+    if n >= MIN_TRAINING_POINTS["ivf_sq8"]:
+        candidates.append({"type": "ivf_sq8", "nlist": nlist, "pq_m": 0})
+    if n >= MIN_TRAINING_POINTS["ivf_pq"]:
+        candidates += [{"type": "ivf_pq", "nlist": nlist, "pq_m": m}
+                       for m in sorted((m for m in range(4, 97) if dim % m == 0), reverse=True)]
+    if index_type != "auto":
+        candidates = [c for c in candidates if c["type"] == index_type] or candidates[:1]
+
+    for candidate in candidates:
+        candidate["bytes"] = estimate_index_bytes(candidate["type"], n, dim, candidate["nlist"], candidate["pq_m"])
+        if candidate["bytes"] <= max_memory_bytes:
+            return candidate
+    raise MemoryError(f"A {n} chunks index needs at least {candidates[-1]['bytes'] // 2**20} MB, "
+                      f"over the {max_memory_bytes // 2**20} MB session limit.")
+
+
+def training_points(n: int) -> int:
+    """Size of the training sample of an IVF index over n vectors."""
+    return min(n, MAX_TRAINING_POINTS)
+
+
+def _embed_to_memmap(texts: List[str], embeddings: Embeddings, path: str) -> np.memmap:
+    """Embeds texts block by block into a memory-mapped float32 matrix."""
+    first = np.asarray(embeddings.embed_documents(texts[:EMBEDDING_BLOCK]), dtype=np.float32)
+    vectors = np.memmap(path, dtype=np.float32, mode="w+", shape=(len(texts), first.shape[1]))
+    vectors[:len(first)] = first
+    for start in range(EMBEDDING_BLOCK, len(texts), EMBEDDING_BLOCK):
+        block = texts[start:start + EMBEDDING_BLOCK]
+        vectors[start:start + len(block)] = np.asarray(embeddings.embed_documents(block), dtype=np.float32)
+    vectors.flush()
+    return vectors
+
+
+def build_disk_vector_store(chunks: List[Document], embeddings: Embeddings, storage_dir: str,
+                            max_memory_mb: float = 256, index_type: str = "auto", nprobe: int = 16) -> FAISS:
+    """
+    Builds a FAISS vector store whose chunk texts live in SQLite and whose vectors are
+    compressed so that the index stays under max_memory_mb.
+    IVF indexes are written to disk and memory-mapped back.
+
+    Args:
+        chunks (List[Document]): split document.
+        embeddings (Embeddings): embedding model.
+        storage_dir (str): directory for the index, docstore and temporary vectors.
+        max_memory_mb (float): memory budget for this index.
+        index_type (str): "auto", "flat", "ivf_sq8" or "ivf_pq", flat when there are too few chunks
+            to train the requested type (see MIN_TRAINING_POINTS).
+        nprobe (int): inverted lists visited per query for IVF indexes.
+
+    Returns:
+        FAISS: a LangChain vector store usable with as_retriever().
+    """
+    os.makedirs(storage_dir, exist_ok=True)
+    vectors_path = os.path.join(storage_dir, "vectors.f32")
+    vectors = _embed_to_memmap([chunk.page_content for chunk in chunks], embeddings, vectors_path)
+    n, dim = vectors.shape
+
+    spec = choose_index(n, dim, int(max_memory_mb * 2**20), index_type)
+    if spec["type"] == "flat":
+        index = faiss.IndexFlatL2(dim)
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if spec["type"] == "ivf_sq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, spec["nlist"], faiss.ScalarQuantizer.QT_8bit)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, spec["nlist"], spec["pq_m"], 8)
+        sample = np.random.default_rng(0).choice(n, size=training_points(n), replace=False)
+        index.train(np.ascontiguousarray(vectors[np.sort(sample)]))
+
+    for start in range(0, n, EMBEDDING_BLOCK):
+        index.add(np.ascontiguousarray(vectors[start:start + EMBEDDING_BLOCK]))
+    del vectors
+    os.remove(vectors_path)
+
+    if spec["type"] != "flat":
+        index_path = os.path.join(storage_dir, "index.faiss")
+        faiss.write_index(index, index_path)
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        index.nprobe = nprobe
+
+    docstore = SQLiteDocstore(os.path.join(storage_dir, "chunks.sqlite"))
+    ids = [str(i) for i in range(n)]
+    docstore.add(dict(zip(ids, chunks)))
+
+    store = FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+    store.index_memory_bytes = spec["bytes"]
+    return store
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, 0 when it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+
+def benchmark(chunks: List[Document], queries: List[str], embeddings: Embeddings, storage_dir: str,
+              k: int = 4, index_types: Optional[List[str]] = None, max_memory_mb: float = 1024) -> List[dict]:
+    """
+    Compares index types on recall@k (against an exact flat index), RSS growth and query latency.
+    """
+    exact = FAISS.from_documents(chunks, embeddings)
+    truth = [{doc.page_content for doc in exact.similarity_search(q, k=k)} for q in queries]
+    del exact
+
+    results = []
+    for index_type in index_types or ["flat", "ivf_sq8", "ivf_pq"]:
+        rss_before = current_rss_bytes()
+        store = build_disk_vector_store(chunks, embeddings, os.path.join(storage_dir, index_type),
+                                        max_memory_mb=max_memory_mb, index_type=index_type)
+        rss_after = current_rss_bytes()
+
+        hits, start = 0, time.perf_counter()
+        for query, expected in zip(queries, truth):
+            found = {doc.page_content for doc in store.similarity_search(query, k=k)}
+            hits += len(found & expected)
+        latency = (time.perf_counter() - start) / max(1, len(queries))
+
+        results.append({
+            "index": index_type,
+            "recall": hits / max(1, sum(len(t) for t in truth)),
+            "rss_mb": (rss_after - rss_before) / 2**20,
+            "index_mb": store.index_memory_bytes / 2**20,
+            "latency_ms": latency * 1000,
+        })
+        store.docstore.close()
+    return results
+
+
+def main():
+    import argparse
+    import tempfile
+    from core.retrieval.embeddings import get_embeddings
+
+    parser = argparse.ArgumentParser(description="Recall vs RSS vs latency for the document index types.")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backend", default="hashing")
+    args = parser.parse_args()
+
+    chunks = [Document(page_content=f"Section {i % 97}.{i % 13}: invoice {i} for customer {i % 501} "
+                                    f"covers item SKU-{i % 2003:05d} delivered in week {i % 52}.")
+              for i in range(args.chunks)]
+    queries = [f"invoice for customer {i * 7 % 501} item SKU-{i * 11 % 2003:05d}" for i in range(args.queries)]
+    embeddings = get_embeddings(args.backend)
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        for row in benchmark(chunks, queries, embeddings, storage_dir):
+            print(f"{row['index']:>8}: recall@4={row['recall']:.3f}  rss=+{row['rss_mb']:.1f} MB  "
+                  f"index~{row['index_mb']:.1f} MB  latency={row['latency_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import hashlib
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingBackend(ABC):
+    """
+    A raw embedding model. Backends only know how to embed one batch of texts,
+    batching, concurrency and retries are handled by BatchedEmbeddings.
+    """
+    name = "backend"
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        pass
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+
+class GoogleEmbeddingBackend(EmbeddingBackend):
+    """Gemini embeddings, one network call per batch."""
+    name = "google"
+
+    def __init__(self, model: str = "models/embedding-001"):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        self.client = GoogleGenerativeAIEmbeddings(model=model)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_documents(texts, batch_size=len(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed_query(text)
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Offline CPU backend: signed feature hashing of word unigrams and bigrams,
+    with sublinear term frequency and L2 normalisation.
+    No model download and no network, usable in air-gapped deployments and tests.
+    """
+    name = "hashing"
+    TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dim: int = 768, ngrams: int = 2):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def _features(self, text: str) -> List[str]:
+        tokens = self.TOKEN_PATTERN.findall(text.lower())
+        features = list(tokens)
+        for n in range(2, self.ngrams + 1):
+            features += [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        return features
+
+    def _hash(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter((self._hash(f) for f in self._features(text)), dtype=np.uint64)
+            if not len(hashes):
+                continue
+            columns = (hashes % self.dim).astype(np.int64)
+            signs = np.where((hashes >> np.uint64(63)) == 1, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], columns, signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        return matrix.tolist()
+
+
+class EmbeddingStats:
+    """Throughput counters for one BatchedEmbeddings instance."""
+
+    def __init__(self):
+        self.chunks = 0
+        self.batches = 0
+        self.retries = 0
+        self.queries = 0
+        self.seconds = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.chunks} chunks in {self.batches} batches, {self.seconds:.2f}s "
+                f"({self.chunks_per_second:.1f} chunks/s, {self.retries} retries)")
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper around an EmbeddingBackend.
+
+    Args:
+        backend (EmbeddingBackend): the model doing the actual work.
+        batch_size (int): number of chunks sent per backend call.
+        max_concurrency (int): number of batches in flight at the same time.
+        max_retries (int): attempts per batch before giving up.
+        retry_delay (float): first backoff delay in seconds, doubled on each retry.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, batch_size: int = 64, max_concurrency: int = 4,
+                 max_retries: int = 3, retry_delay: float = 1.0):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(1, max_retries)
+        self.retry_delay = retry_delay
+        self.stats = EmbeddingStats()
+
+    def _with_retry(self, fn, *args):
+        for attempt in range(self.max_retries):
+            try:
+                return fn(*args)
+            except Exception:
+                if attempt == self.max_retries - 1:
+                    raise
+                self.stats.retries += 1
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.max_concurrency == 1 or len(batches) <= 1:
+            results = [self._with_retry(self.backend.embed_batch, batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(lambda batch: self._with_retry(self.backend.embed_batch, batch), batches))
+
+        self.stats.chunks += len(texts)
+        self.stats.batches += len(batches)
+        self.stats.seconds += time.perf_counter() - start
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.stats.queries += 1
+        return self._with_retry(self.backend.embed_query, text)
+
+
+EMBEDDING_BACKENDS: Dict[str, type] = {
+    GoogleEmbeddingBackend.name: GoogleEmbeddingBackend,
+    HashingEmbeddingBackend.name: HashingEmbeddingBackend,
+}
+
+
+def get_embeddings(backend: str = "google", batch_size: int = 64, max_concurrency: int = 4,
+                   max_retries: int = 3, **backend_kwargs) -> BatchedEmbeddings:
+    """
+    Builds a BatchedEmbeddings from a backend name.
+
+    Args:
+        backend (str): one of EMBEDDING_BACKENDS ("google", "hashing").
+        backend_kwargs: forwarded to the backend constructor.
+
+    Returns:
+        BatchedEmbeddings
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: '{backend}'. Expected one of {list(EMBEDDING_BACKENDS)}.")
+    return BatchedEmbeddings(EMBEDDING_BACKENDS[backend](**backend_kwargs), batch_size=batch_size,
+                             max_concurrency=max_concurrency, max_retries=max_retries)
+
+
+def benchmark_backends(texts: List[str], backends: Optional[List[str]] = None, **kwargs) -> Dict[str, EmbeddingStats]:
+    """
+    Embeds the same texts with each backend and returns their throughput stats.
+    """
+    results = {}
+    for name in backends or list(EMBEDDING_BACKENDS):
+        embeddings = get_embeddings(name, **kwargs)
+        embeddings.embed_documents(texts)
+        results[name] = embeddings.stats
+    return results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Report embedding throughput (chunks/s) for each backend.")
+    parser.add_argument("--backends", nargs="+", default=["hashing"])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    texts = [f"Clause {i}.{i % 7}: the supplier shall deliver item SKU-{i:05d} within {i % 30} days."
+             for i in range(args.chunks)]
+    for name, stats in benchmark_backends(texts, args.backends, batch_size=args.batch_size,
+                                          max_concurrency=args.concurrency).items():
+        print(f"{name}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Keeps clause numbers (4.2.1), SKUs (AB-1234) and e-mails in one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./@_][a-z0-9]+)*")
+CODE_PATTERN = re.compile(r"\d|[-./@_]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase tokens. Compound tokens are kept whole and also split in their parts,
+    so "SKU-1234" matches both "sku-1234" and "1234".
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if CODE_PATTERN.search(token):
+            parts = re.split(r"[-./@_]", token)
+            if len(parts) > 1:
+                tokens += [part for part in parts if part]
+    return tokens
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index over document chunks, built once at ingest time.
+    Postings are stored as NumPy arrays, a query only touches the postings of its terms.
+    """
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for chunk_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((chunk_id, tf))
+
+        self.size = len(texts)
+        self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        avg_length = float(self.doc_lengths.mean()) if self.size else 0.0
+        self.length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (avg_length or 1.0))
+        self.postings = {
+            term: (np.fromiter((p[0] for p in plist), dtype=np.int32, count=len(plist)),
+                   np.fromiter((p[1] for p in plist), dtype=np.float32, count=len(plist)))
+            for term, plist in postings.items()
+        }
+        self.idf = {term: float(np.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5)))
+                    for term, (ids, _) in self.postings.items()}
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """
+        Returns the k best (chunk_id, bm25 score) pairs, best first.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            scores[ids] += self.idf[term] * tfs * (self.k1 + 1) / (tfs + self.length_norm[ids])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    Queries with codes, numbers or quoted phrases, or with very few terms, are better served by BM25.
+    """
+    tokens = TOKEN_PATTERN.findall(query.lower())
+    return '"' in query or len(tokens) <= 3 or any(CODE_PATTERN.search(t) for t in tokens)
+
+
+def _normalize(scores: Dict[int, float]) -> Dict[int, float]:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    return {key: (value - low) / (high - low) if high > low else 1.0 for key, value in scores.items()}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses BM25 and vector scores of the same chunks.
+
+    Modes:
+    - "hybrid": min-max normalised scores, alpha * vector + (1 - alpha) * bm25.
+    - "keyword": BM25 only, no embedding call.
+    - "vector": vector search only.
+    - "auto": keyword for keyword-heavy queries with a BM25 hit, hybrid otherwise.
+
+    Chunks must carry their position in the ingested list as metadata["chunk_id"].
+    """
+    keyword_index: Any
+    vector_store: Any
+    get_chunk: Callable[[int], Document]
+    k: int = 4
+    fetch_k: int = 20
+    alpha: float = 0.5
+    mode: str = "auto"
+
+    def _keyword_scores(self, query: str) -> Dict[int, float]:
+        return dict(self.keyword_index.search(query, self.fetch_k))
+
+    def _vector_scores(self, query: str) -> Dict[int, float]:
+        results = self.vector_store.similarity_search_with_score(query, k=self.fetch_k)
+        # FAISS returns distances, smaller is better
+        return {doc.metadata["chunk_id"]: -float(distance) for doc, distance in results}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        mode = self.mode
+        keyword = self._keyword_scores(query) if mode != "vector" else {}
+        if mode == "auto":
+            mode = "keyword" if keyword and is_keyword_query(query) else "hybrid"
+
+        if mode == "keyword":
+            fused = keyword
+        elif mode == "vector":
+            fused = self._vector_scores(query)
+        else:
+            vector = _normalize(self._vector_scores(query))
+            keyword = _normalize(keyword)
+            fused = {chunk_id: self.alpha * vector.get(chunk_id, 0.0) + (1 - self.alpha) * keyword.get(chunk_id, 0.0)
+                     for chunk_id in set(vector) | set(keyword)}
+
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [self.get_chunk(chunk_id) for chunk_id in best]
+
+
+def evaluate(retriever: BaseRetriever, cases: List[dict], embeddings=None) -> dict:
+    """
+    Measures retrieval quality and latency.
+
+    Args:
+        retriever (BaseRetriever): retriever to evaluate.
+        cases (List[dict]): {"query": str, "expected": str}, a hit is a retrieved chunk containing "expected".
+        embeddings: optional BatchedEmbeddings, to count query embedding calls.
+
+    Returns:
+        dict: hit rate, mean reciprocal rank, mean latency in ms, query embedding calls.
+    """
+    hits, reciprocal_ranks, calls_before = 0, 0.0, embeddings.stats.queries if embeddings else 0
+    start = time.perf_counter()
+    for case in cases:
+        docs = retriever.invoke(case["query"])
+        rank = next((i for i, doc in enumerate(docs, 1) if case["expected"].lower() in doc.page_content.lower()), None)
+        if rank:
+            hits += 1
+            reciprocal_ranks += 1 / rank
+    elapsed = time.perf_counter() - start
+    count = max(1, len(cases))
+    return {
+        "hit_rate": hits / count,
+        "mrr": reciprocal_ranks / count,
+        "latency_ms": elapsed / count * 1000,
+        "embedding_calls": (embeddings.stats.queries - calls_before) if embeddings else None,
+    }
+
+
+def main():
+    import argparse
+    import glob
+    import json
+    import os
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_community.vectorstores import FAISS
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from core.retrieval.embeddings import get_embeddings
+
+    parser = argparse.ArgumentParser(description="Compare keyword, vector and hybrid retrieval on a PDF fixture set.")
+    parser.add_argument("pdf_dir", help="directory of fixture PDFs")
+    parser.add_argument("cases", help='JSON list of {"query": ..., "expected": ...}')
+    parser.add_argument("--backend", default="hashing")
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    docs = []
+    for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        docs += PyPDFLoader(path).load()
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_documents(docs)
+    for chunk_id, chunk in enumerate(chunks):
+        chunk.metadata["chunk_id"] = chunk_id
+
+    with open(args.cases, encoding="utf-8") as f:
+        cases = json.load(f)
+
+    embeddings = get_embeddings(args.backend)
+    store = FAISS.from_documents(chunks, embeddings)
+    keyword_index = KeywordIndex([chunk.page_content for chunk in chunks])
+    for mode in ["keyword", "vector", "hybrid", "auto"]:
+        retriever = HybridRetriever(keyword_index=keyword_index, vector_store=store,
+                                    get_chunk=chunks.__getitem__, k=args.k, mode=mode)
+        result = evaluate(retriever, cases, embeddings)
+        print(f"{mode:>8}: hit@{args.k}={result['hit_rate']:.3f}  mrr={result['mrr']:.3f}  "
+              f"latency={result['latency_ms']:.2f} ms  embedding calls={result['embedding_calls']}")
+
+
+if __name__ == "__main__":
+    main()
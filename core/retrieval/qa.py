@@ -0,0 +1,76 @@
+from typing import List
+
+from langchain_core.documents import Document
+
+STUFF_PROMPT = (
+    "Use the following extracts of a document to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\nQuestion: {question}\nHelpful Answer:"
+)
+
+MAP_PROMPT = (
+    "Use the following extract of a document to see if any of the text is relevant to answer the question. "
+    "Return any relevant text verbatim, or NONE if nothing is relevant.\n\n"
+    "{context}\n\nQuestion: {question}\nRelevant text, if any:"
+)
+
+REDUCE_PROMPT = (
+    "Given the following notes extracted from a long document and a question, create a final answer. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\nQuestion: {question}\nFinal Answer:"
+)
+
+
+class DocumentQA:
+    """
+    Question answering over one document, built once per document and reused for every query.
+
+    Args:
+        llm: LangChain chat model, shared between documents.
+        retriever: LangChain retriever of the document.
+        chain_type (str): "stuff" puts the retrieved chunks in one prompt,
+            "map_reduce" asks one question per chunk concurrently then merges the partial answers.
+        max_context_chars (int): maximum size of the context sent in a single prompt.
+        max_concurrency (int): number of per-chunk calls in flight in map_reduce mode.
+    """
+
+    def __init__(self, llm, retriever, chain_type: str = "stuff", max_context_chars: int = 12000,
+                 max_concurrency: int = 4):
+        if chain_type not in ("stuff", "map_reduce"):
+            raise ValueError(f"Unsupported chain type: '{chain_type}'. Expected 'stuff' or 'map_reduce'.")
+        self.llm = llm
+        self.retriever = retriever
+        self.chain_type = chain_type
+        self.max_context_chars = max_context_chars
+        self.max_concurrency = max_concurrency
+
+    def run(self, query: str) -> str:
+        docs = self.retriever.invoke(query)
+        if self.chain_type == "map_reduce":
+            return self._map_reduce(query, docs)
+        return self._ask(STUFF_PROMPT, self._fit([doc.page_content for doc in docs]), query)
+
+    def _map_reduce(self, query: str, docs: List[Document]) -> str:
+        prompts = [MAP_PROMPT.format(context=doc.page_content[:self.max_context_chars], question=query)
+                   for doc in docs]
+        partials = self.llm.batch(prompts, config={"max_concurrency": self.max_concurrency})
+        notes = [p.content.strip() for p in partials if p.content.strip() and p.content.strip().upper() != "NONE"]
+        return self._ask(REDUCE_PROMPT, self._fit(notes), query)
+
+    def _ask(self, prompt: str, context: str, query: str) -> str:
+        return self.llm.invoke(prompt.format(context=context, question=query)).content
+
+    def _fit(self, texts: List[str]) -> str:
+        """Joins texts in rank order, stopping at max_context_chars."""
+        parts, size = [], 0
+        for text in filter(None, texts):
+            # The "\n\n" separator counts towards the budget
+            separator = 2 if parts else 0
+            room = max(0, self.max_context_chars - size - separator)
+            if len(text) > room:
+                if room:
+                    parts.append(text[:room])
+                break
+            parts.append(text)
+            size += separator + len(text)
+        return "\n\n".join(parts)
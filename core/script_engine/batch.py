@@ -0,0 +1,163 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+from core.pricing import pool_price
+from core.script_engine.loader import SCRIPTS_PATH, load_scripts
+from core.script_engine.step import Step
+
+# Column computed for the accepted rows of each script, from the validated columns
+PRICERS = {
+    "pool_quotation": ("price", lambda columns: np.round(pool_price(columns["length"], columns["width"]), 2)),
+}
+
+TRUE_WORDS = ["yes", "true", "1", "oui"]
+
+
+def read_rows(path: str) -> list[dict]:
+    """Rows of a CSV file (with a header) or of a JSONL file, one object per line."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def write_rows(path: str, rows: list[dict], fieldnames: list[str]):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps({key: row.get(key) for key in fieldnames}, ensure_ascii=False) + "\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def parse_column(raw: np.ndarray, type_: type) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Column version of Script._parse: (parsed values, mask of present and parsable cells).
+    Numbers are converted in one NumPy cast, only a column with bad cells is retried cell by cell.
+    """
+    text = np.char.strip(raw.astype(str))
+    present = (text != "") & (text != "None")
+    if type_ in (int, float):
+        text = np.char.replace(text, ",", ".")
+        values = np.full(len(text), np.nan)
+        ok = present.copy()
+        try:
+            values[present] = text[present].astype(float)
+        except ValueError:
+            for i in np.flatnonzero(present):
+                try:
+                    values[i] = float(text[i])
+                except ValueError:
+                    ok[i] = False
+        # "nan" and "inf" parse as floats but are not values
+        ok &= np.isfinite(values)
+        if type_ is int:
+            ok &= values == np.round(values)
+        return values, ok
+    if type_ is bool:
+        return np.isin(np.char.lower(text), TRUE_WORDS), present
+    return text.astype(object), present
+
+
+def evaluate(columns: dict[str, np.ndarray], steps: tuple[Step, ...]) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """
+    Parses and validates every step over whole columns.
+    Returns the parsed columns and the error message of each row ("" for valid rows).
+    Like Script.assign, only the first failing validator of a step is reported.
+    """
+    rows = len(next(iter(columns.values()))) if columns else 0
+    errors = np.full(rows, "", dtype=object)
+    parsed = {}
+    for step in steps:
+        raw = columns.get(step.var, np.full(rows, "", dtype=object))
+        values, ok = parse_column(raw, step.type_)
+        missing = (np.char.strip(raw.astype(str)) == "") | (raw == None)  # noqa: E711, element-wise
+        errors[missing] += f"{step.var}: missing; "
+        errors[~ok & ~missing] += f"{step.var}: Expected a {step.type_.__name__}.; "
+        for validator in step.validators:
+            indices = np.flatnonzero(ok)
+            valid, messages = validator.validate_array(values[indices])
+            failed = indices[~valid]
+            errors[failed] += f"{step.var}: " + messages[~valid] + "; "
+            ok[failed] = False
+        parsed[step.var] = values
+    errors = np.array([error.rstrip("; ") for error in errors], dtype=object)
+    return parsed, errors
+
+
+def run_batch(rows: list[dict], script: str = "pool_quotation", path: str = SCRIPTS_PATH) -> dict:
+    """
+    Runs rows through the steps of a script, without any LLM call.
+    Returns the accepted rows (parsed values and computed column), the rejected rows with their errors, and timings.
+    """
+    started = time.perf_counter()
+    steps = load_scripts(path)[script]
+    if not rows:
+        # NumPy string operations fail on empty columns
+        return {"accepted": [], "rejected": [], "fields": [step.var for step in steps], "seconds": 0.0,
+                "rows_per_second": 0.0}
+    columns = {step.var: np.array([row.get(step.var) for row in rows], dtype=object) for step in steps}
+    parsed, errors = evaluate(columns, steps)
+    valid = errors == ""
+
+    accepted = {var: values[valid] for var, values in parsed.items()}
+    if script in PRICERS and valid.any():
+        name, pricer = PRICERS[script]
+        accepted[name] = pricer(accepted)
+    seconds = time.perf_counter() - started
+
+    accepted_rows = [dict(zip(accepted, values)) for values in zip(*(column.tolist() for column in accepted.values()))]
+    rejected_rows = [{"row": int(i) + 1, **rows[i], "errors": errors[i]} for i in np.flatnonzero(~valid)]
+    return {
+        "accepted": accepted_rows,
+        "rejected": rejected_rows,
+        "fields": list(accepted) or [step.var for step in steps],
+        "seconds": seconds,
+        "rows_per_second": len(rows) / seconds if seconds else float("inf"),
+    }
+
+
+def generate_sample(path: str, rows: int, seed: int = 0):
+    """Random pool requests, some out of range or with a bad email, to benchmark the engine."""
+    rng = np.random.default_rng(seed)
+    length = np.round(rng.uniform(0, 17, rows), 1)
+    width = np.round(rng.uniform(0.5, 11, rows), 1)
+    emails = np.where(rng.random(rows) < 0.97, np.char.add(np.char.add("client", np.arange(rows).astype(str)),
+                                                            "@example.com"), "not-an-email")
+    write_rows(path, [{"length": str(l), "width": str(w), "email": e} for l, w, e in zip(length, width, emails)],
+               ["length", "width", "email"])
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Quote a CSV or JSONL file of requests offline, without LLM calls.")
+    parser.add_argument("input", help="CSV (with header) or JSONL file, one column per script variable")
+    parser.add_argument("--script", default="pool_quotation")
+    parser.add_argument("--output", default="quotes.csv", help="accepted rows with the computed price")
+    parser.add_argument("--rejected", default="rejected.csv", help="rejected rows with their validator messages")
+    parser.add_argument("--generate", type=int, default=0, help="first write that many random requests to input")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_sample(args.input, args.generate)
+
+    started = time.perf_counter()
+    rows = read_rows(args.input)
+    result = run_batch(rows, args.script)
+    write_rows(args.output, result["accepted"], result["fields"])
+    write_rows(args.rejected, result["rejected"], ["row", *rows[0].keys(), "errors"] if rows else ["row", "errors"])
+    total = time.perf_counter() - started
+
+    print(f"{len(rows)} rows: {len(result['accepted'])} accepted -> {args.output}, "
+          f"{len(result['rejected'])} rejected -> {args.rejected}")
+    print(f"engine: {result['seconds']:.3f}s ({result['rows_per_second']:,.0f} rows/s), "
+          f"with file I/O: {total:.3f}s ({len(rows) / total:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
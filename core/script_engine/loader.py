@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+
+from core.script_engine.script import Script
+from core.script_engine.step import Step
+from core.script_engine.validator import OneOf, Range, Regex
+
+SCRIPTS_PATH = "config/scripts.json"
+
+TYPES = {"float": float, "int": int, "str": str, "bool": bool}
+VALIDATORS = {"range": Range, "regex": Regex, "one_of": OneOf}
+
+_compiled: dict[str, dict[str, tuple[Step, ...]]] = {}
+_lock = threading.Lock()
+
+
+def compile_steps(definition: dict) -> tuple[Step, ...]:
+    """
+    Turns a script definition into its step table: types resolved, validators built and patterns compiled.
+    The table is shared by every session and never mutated.
+    """
+    steps = []
+    for step in definition["steps"]:
+        if step["type"] not in TYPES:
+            raise ValueError(f"Unknown type '{step['type']}' for step '{step['var']}', expected one of {list(TYPES)}")
+        validators = []
+        for validator in step.get("validators", []):
+            params = {key: value for key, value in validator.items() if key != "type"}
+            if validator["type"] not in VALIDATORS:
+                raise ValueError(f"Unknown validator '{validator['type']}' for step '{step['var']}'")
+            validators.append(VALIDATORS[validator["type"]](**params))
+        steps.append(Step(step["prompt"], step["var"], TYPES[step["type"]], validators=tuple(validators),
+                          pattern=step.get("pattern"), aliases=step.get("aliases"),
+                          suffixes=step.get("suffixes")))
+    return tuple(steps)
+
+
+def _read(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # optional, only needed for YAML definitions
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_scripts(path: str = SCRIPTS_PATH) -> dict[str, tuple[Step, ...]]:
+    """
+    Reads and compiles every script of a JSON or YAML file, once per process.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _compiled:
+            _compiled[path] = {name: compile_steps(definition)
+                               for name, definition in _read(path).get("scripts", {}).items()}
+        return _compiled[path]
+
+
+def get_script(name: str, state: dict = None, path: str = SCRIPTS_PATH) -> Script:
+    """
+    New session on a compiled script, or the session resumed from a state saved with Script.state().
+    """
+    scripts = load_scripts(path)
+    if name not in scripts:
+        raise KeyError(f"Unknown script '{name}', available: {', '.join(scripts)}")
+    return Script(scripts[name], values=(state or {}).get("values"), name=name)
+
+
+def resume_script(state: dict, path: str = SCRIPTS_PATH) -> Script:
+    """Rebuilds a session from Script.state(), on any worker."""
+    return get_script(state["script"], state, path)
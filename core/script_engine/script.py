@@ -1,25 +1,53 @@
+import math
 from typing import Any
 from core.script_engine.step import Step
 
 class Script:
-    def __init__(self, steps: list[Step]):
+    def __init__(self, steps: list[Step], values: dict = None, name: str = None):
+        """
+        steps can be a compiled table shared between sessions (see loader.py),
+        the session state is only the name and the values.
+        """
         self.steps = steps
-        self.index = 0
-        self.values = {}
+        self.values = dict(values or {})
+        self.name = name
+
+    def state(self) -> dict:
+        """JSON-serializable session state, resumed with loader.resume_script or Script(steps, state["values"])."""
+        return {"script": self.name, "values": dict(self.values)}
+
+    @property
+    def index(self) -> int:
+        """Position of the first step without a value, len(steps) once all are filled."""
+        return next((i for i, step in enumerate(self.steps) if step.var not in self.values), len(self.steps))
 
     def current_step(self) -> Step | None:
         if self.index < len(self.steps):
             return self.steps[self.index]
         return None
 
+    def missing(self) -> list[Step]:
+        return [step for step in self.steps if step.var not in self.values]
+
     def _parse(self, raw: str, expected_type: type) -> Any | None:
         try:
             if expected_type == bool:
                 return raw.lower() in ["yes", "true", "1", "oui"]
+            if expected_type in (int, float):
+                raw = raw.strip().replace(",", ".")
+                if not math.isfinite(float(raw)):
+                    return None
             return expected_type(raw)
         except Exception:
             return None
 
+    def _validate(self, step: Step, value: Any) -> str | None:
+        for validator in step.validators:
+            ok, msg = validator.validate(value)
+            if not ok:
+                return msg
+        return None
+
     def assign(self, user_input: str) -> str:
         step = self.current_step()
         if not step:
@@ -29,15 +57,96 @@ class Script:
         if parsed is None:
             return f"❌ Expected a {step.type_.__name__}."
 
-        for validator in step.validators:
-            ok, msg = validator.validate(parsed)
-            if not ok:
-                return f"❌ {msg}"
+        error = self._validate(step, parsed)
+        if error:
+            return f"❌ {error}"
 
         self.values[step.var] = parsed
-        self.index += 1
         return f"Added: {step.var} = {parsed}"
 
+    def extract(self, message: str) -> dict[str, str]:
+        """
+        Finds the raw values of every missing step in one message, in three passes over the compiled patterns:
+        values labelled by an alias or a suffix ("width 5", "5 m wide"), then steps with their own pattern
+        (e.g. an email), then the remaining type patterns in step order ("12 by 5" fills length then width).
+        A span of the message is used by one step only. A labelled value failing validation does not use
+        its span: it is only returned, to report the error, when the step finds no valid value.
+        """
+        found, taken, rejected = {}, [], {}
+
+        def free(start: int, end: int) -> bool:
+            return all(end <= s or start >= e for s, e in taken)
+
+        def take(step: Step, match, group: int):
+            found[step.var] = match.group(group)
+            taken.append(match.span(group))
+
+        missing = self.missing()
+        for step in missing:
+            matches = [match for pattern in (step.labelled_pattern, step.suffix_pattern) if pattern
+                       for match in pattern.finditer(message)]
+            for match in matches:
+                parsed = self._parse(match.group(1), step.type_)
+                if not free(*match.span(1)) or parsed is None:
+                    continue
+                if self._validate(step, parsed) is None:
+                    take(step, match, 1)
+                    break
+                rejected.setdefault(step.var, match)
+        # Values labelled for a step are not handed to another one by position
+        reserved = [match.span(1) for match in rejected.values()]
+        for explicit in (True, False):
+            for step in missing:
+                if step.var in found or step.var in rejected or step.pattern is None or step.explicit_pattern != explicit:
+                    continue
+                for match in step.pattern.finditer(message):
+                    if free(*match.span()) and match.span() not in reserved \
+                            and self._parse(match.group(), step.type_) is not None:
+                        take(step, match, 0)
+                        break
+        for var, match in rejected.items():
+            found.setdefault(var, match.group(1))
+
+        # A step without pattern (free text) takes the whole message, when it is the only answer
+        step = self.current_step()
+        if not found and step is not None and step.pattern is None and message.strip():
+            found[step.var] = message.strip()
+        return found
+
+    def fill(self, message: str) -> tuple[dict[str, Any], dict[str, str]]:
+        """
+        Fills every step it can from one message. All extracted values are parsed and validated
+        together, valid ones are stored. Returns (added values, errors by variable).
+        """
+        added, errors = {}, {}
+        extracted = self.extract(message)
+        for step in self.steps:
+            if step.var not in extracted:
+                continue
+            parsed = self._parse(extracted[step.var], step.type_)
+            error = f"Expected a {step.type_.__name__}." if parsed is None else self._validate(step, parsed)
+            if error:
+                errors[step.var] = error
+            else:
+                added[step.var] = parsed
+        self.values.update(added)
+        return added, errors
+
+    def report(self, added: dict[str, Any], errors: dict[str, str], closing: str = None) -> str:
+        """
+        What was added, what was rejected and what is still missing, then the next question
+        (or closing once all steps are filled, when given).
+        """
+        lines = []
+        if added:
+            lines.append("Added: " + ", ".join(f"{var} = {value}" for var, value in added.items()))
+        lines += [f"❌ {var}: {error}" for var, error in errors.items()]
+        missing = self.missing()
+        if len(missing) > 1:
+            lines.append("Still missing: " + ", ".join(step.var for step in missing))
+        lines.append(closing if closing and not missing else self.next_prompt())
+        return "\n".join(lines)
+
     def next_prompt(self) -> str:
         step = self.current_step()
         if step:
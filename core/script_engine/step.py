@@ -1,6 +1,37 @@
+import re
+
+# Where to look for a value of each type inside a free-form message
+DEFAULT_PATTERNS = {
+    float: r"-?\d+(?:[.,]\d+)?",
+    int: r"-?\d+",
+    bool: r"\b(?:yes|no|true|false|oui|non)\b",
+}
+
 class Step:
-    def __init__(self, prompt: str, var: str, type_: type, validators=None):
+    def __init__(self, prompt: str, var: str, type_: type, validators=None, pattern: str = None, aliases=None,
+                 suffixes=None):
+        """
+        pattern: regex locating the value inside a longer message (defaults to DEFAULT_PATTERNS for the type).
+        aliases: words announcing the value before it, e.g. ["width"], the variable name by default.
+        suffixes: words qualifying the value after it, e.g. ["wide"] in "5 m wide".
+        All are compiled once, with the step.
+        """
         self.prompt = prompt
         self.var = var
         self.type_ = type_
         self.validators = validators or []
+        self.aliases = aliases or [var]
+        self.suffixes = suffixes or []
+        self.explicit_pattern = pattern is not None
+        pattern = pattern or DEFAULT_PATTERNS.get(type_)
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        # "<alias> is 12", "<alias>: 12", "<alias> of about 12"
+        self.labelled_pattern = re.compile(
+            r"\b(?:%s)\b\W*(?:\w+\W+){0,2}?(%s)" % ("|".join(map(re.escape, self.aliases)), pattern),
+            re.IGNORECASE,
+        ) if pattern else None
+        # "12 m long", "8 meters wide": the value is the one right before the word
+        self.suffix_pattern = re.compile(
+            r"(?<![\w.,])(%s)\W*(?:\w+\W+){0,2}?\b(?:%s)\b" % (pattern, "|".join(map(re.escape, self.suffixes))),
+            re.IGNORECASE,
+        ) if pattern and self.suffixes else None
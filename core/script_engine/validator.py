@@ -1,11 +1,22 @@
 import re
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 class Validator(ABC):
     @abstractmethod
     def validate(self, value) -> tuple[bool, str]:
         pass
 
+    def validate_array(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Validates a whole column: (mask of valid values, message per value, "" when valid).
+        Falls back to validate() per value, subclasses override it with array operations.
+        """
+        results = [self.validate(value) for value in values]
+        ok = np.fromiter((result[0] for result in results), dtype=bool, count=len(results))
+        return ok, np.array([msg if not valid else "" for valid, msg in results], dtype=object)
+
 class Range(Validator):
     def __init__(self, min=None, max=None):
         self.min = min
@@ -18,6 +29,13 @@ class Range(Validator):
             return False, f"Value must be ≤ {self.max}"
         return True, ""
 
+    def validate_array(self, values):
+        values = np.asarray(values, dtype=float)
+        too_low = values < self.min if self.min is not None else np.zeros(len(values), dtype=bool)
+        too_high = values > self.max if self.max is not None else np.zeros(len(values), dtype=bool)
+        messages = np.where(too_low, f"Value must be ≥ {self.min}", np.where(too_high, f"Value must be ≤ {self.max}", ""))
+        return ~(too_low | too_high), messages.astype(object)
+
 class Regex(Validator):
     def __init__(self, pattern: str, message="Invalid format"):
         self.pattern = re.compile(pattern)
@@ -26,9 +44,18 @@ class Regex(Validator):
     def validate(self, value):
         return (bool(self.pattern.fullmatch(str(value))), self.message)
 
+    def validate_array(self, values):
+        match = self.pattern.fullmatch
+        ok = np.fromiter((match(str(value)) is not None for value in values), dtype=bool, count=len(values))
+        return ok, np.where(ok, "", self.message).astype(object)
+
 class OneOf(Validator):
     def __init__(self, choices):
         self.choices = choices
 
     def validate(self, value):
         return (value in self.choices, f"Must be one of: {', '.join(map(str, self.choices))}")
+
+    def validate_array(self, values):
+        ok = np.isin(np.asarray(values, dtype=object), list(self.choices))
+        return ok, np.where(ok, "", f"Must be one of: {', '.join(map(str, self.choices))}").astype(object)
@@ -0,0 +1,25 @@
+from core.script_engine.batch import main, run_batch
+
+
+def test_run_batch_without_rows():
+    result = run_batch([])
+    assert result["accepted"] == [] and result["rejected"] == []
+    assert result["fields"] == ["length", "width", "email"]
+
+
+def test_cli_on_header_only_csv(tmp_path, monkeypatch, capsys):
+    source = tmp_path / "requests.csv"
+    source.write_text("length,width,email\n", encoding="utf-8")
+    output, rejected = tmp_path / "quotes.csv", tmp_path / "rejected.csv"
+    monkeypatch.setattr("sys.argv", ["batch", str(source), "--output", str(output), "--rejected", str(rejected)])
+    main()
+    assert "0 rows: 0 accepted" in capsys.readouterr().out
+    assert output.read_text(encoding="utf-8").strip() == "length,width,email"
+    assert rejected.read_text(encoding="utf-8").strip() == "row,errors"
+
+
+def test_invalid_rows_are_rejected():
+    result = run_batch([{"length": "8", "width": "4", "email": "a@example.com"},
+                        {"length": "nan", "width": "4", "email": "b@example.com"}])
+    assert len(result["accepted"]) == 1
+    assert [row["row"] for row in result["rejected"]] == [2]
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("litellm")
+
+import agents.CrewAgents.d5_google_docs_agent as d5
+from Clients.fake_docs_service import FakeDocsService
+
+
+class FailingDocsService(FakeDocsService):
+    """Fails the batchUpdate calls whose 1-based number is in fail_on."""
+
+    def __init__(self, fail_on):
+        super().__init__()
+        self.fail_on = set(fail_on)
+        self.attempts = 0
+
+    def _batch_update(self, doc_id, body):
+        self.attempts += 1
+        if self.attempts in self.fail_on:
+            raise RuntimeError("backend error")
+        return super()._batch_update(doc_id, body)
+
+
+def make_agent(service) -> d5.GoogleDocsAgent:
+    # Only the Docs side of the agent is exercised, the crew is not built
+    agent = d5.GoogleDocsAgent.__new__(d5.GoogleDocsAgent)
+    agent.session_id = "test"
+    agent.doc_id = None
+    agent.synced_messages = 0
+    agent.synced_chars = 0
+    agent._docs_service = service
+    agent.messages = []
+    return agent
+
+
+def expected_text(messages) -> str:
+    return "".join(f"{msg['role'].upper()}: {msg['content']}\n" for msg in messages)
+
+
+def test_second_save_only_appends_new_messages():
+    service = FakeDocsService()
+    agent = make_agent(service)
+    agent.messages = [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}]
+    agent.save_conversation()
+    agent.messages.append({"role": "user", "content": "bye"})
+    agent.save_conversation()
+
+    assert service.texts[agent.doc_id] == expected_text(agent.messages)
+    assert service.batch_updates[-1]["requests"][0]["insertText"]["text"] == "USER: bye\n"
+
+
+def test_failed_batch_is_resumed_without_duplicates(monkeypatch):
+    monkeypatch.setattr(d5, "MAX_INSERT_CHARS", 7)
+    monkeypatch.setattr(d5, "MAX_BATCH_CHARS", 14)
+    service = FailingDocsService(fail_on=[3])
+    agent = make_agent(service)
+    agent.messages = [{"role": "user", "content": "a fairly long question"},
+                      {"role": "assistant", "content": "a longer answer, split in several batches"}]
+
+    with pytest.raises(RuntimeError):
+        agent.save_conversation()
+    written = service.texts[agent.doc_id]
+    assert expected_text(agent.messages).startswith(written)
+    # The cursor stopped inside the first message, after the two batches that went through
+    assert (agent.synced_messages, agent.synced_chars) == (0, len(written))
+
+    agent.save_conversation()
+    assert service.texts[agent.doc_id] == expected_text(agent.messages)
+    assert (agent.synced_messages, agent.synced_chars) == (2, 0)
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from Clients.fake_graph_server import FakeGraphServer
+from Clients.outlook_outbox import MAX_BATCH_SIZE, Outbox
+
+
+@pytest.fixture
+def server():
+    with FakeGraphServer() as server:
+        yield server
+
+
+def make_outbox(tmp_path, server, **kwargs) -> Outbox:
+    kwargs.setdefault("token_provider", lambda: server.token)
+    return Outbox("test", db_path=str(tmp_path / "outbox.sqlite"), base_url=server.url, **kwargs)
+
+
+def test_campaign_is_split_into_batches_of_20(tmp_path, server):
+    outbox = make_outbox(tmp_path, server)
+    # Paused so the whole campaign is queued before the first batch goes out
+    outbox._paused_until = time.time() + 3600
+    ids = [outbox.enqueue(f"Campaign {i}", "Hello", ["a@example.com"]) for i in range(45)]
+    outbox._paused_until = 0
+    outbox._wake.set()
+    assert outbox.flush(10)
+    statuses = {outbox.status(tracking_id)["status"] for tracking_id in ids}
+    outbox.close()
+
+    assert server.batches == [MAX_BATCH_SIZE, MAX_BATCH_SIZE, 5]
+    assert len(server.sent) == 45
+    assert server.connections == 1
+    assert statuses == {"sent"}
+
+
+def test_throttled_emails_wait_for_retry_after(tmp_path):
+    with FakeGraphServer(throttle_every=3, retry_after=0.3) as server:
+        outbox = make_outbox(tmp_path, server)
+        ids = [outbox.enqueue(f"Mail {i}", "Hello", ["a@example.com"]) for i in range(6)]
+        assert outbox.flush(10)
+        statuses = [outbox.status(tracking_id) for tracking_id in ids]
+        outbox.close()
+
+    assert server.throttled >= 1
+    assert len(server.sent) == 6
+    assert all(status["status"] == "sent" for status in statuses)
+    # Throttling does not count as a failed attempt
+    assert all(status["attempts"] == 0 for status in statuses)
+
+
+def test_invalid_email_fails_with_graph_message(tmp_path, server):
+    outbox = make_outbox(tmp_path, server)
+    tracking_id = outbox.enqueue("No one", "Hello", [])
+    assert outbox.flush(10)
+    status = outbox.status(tracking_id)
+    outbox.close()
+
+    assert status["status"] == "failed"
+    assert "No recipients" in status["error"]
+
+
+def test_refused_token_is_refreshed(tmp_path, server):
+    tokens = {"current": "revoked"}
+
+    def refresh():
+        tokens["current"] = server.token
+        return tokens["current"]
+
+    outbox = make_outbox(tmp_path, server, token_provider=lambda: tokens["current"], refresh_token=refresh)
+    tracking_id = outbox.enqueue("Hi", "Hello", ["a@example.com"])
+    assert outbox.flush(10)
+    status = outbox.status(tracking_id)
+    outbox.close()
+
+    assert status["status"] == "sent"
+    assert status["attempts"] == 1
+
+
+def test_unanswered_emails_are_sent_again(tmp_path, monkeypatch):
+    monkeypatch.setattr("Clients.outlook_outbox.DEFAULT_RETRY_AFTER", 0.1)
+    with FakeGraphServer(drop_every=2) as server:
+        outbox = make_outbox(tmp_path, server)
+        ids = [outbox.enqueue(f"Mail {i}", "Hello", ["a@example.com"]) for i in range(4)]
+        assert outbox.flush(10)
+        statuses = [outbox.status(tracking_id)["status"] for tracking_id in ids]
+        outbox.close()
+
+    assert server.dropped >= 1
+    assert statuses == ["sent"] * 4
+    assert len(server.sent) == 4
@@ -0,0 +1,46 @@
+import os
+import subprocess
+
+from git import Repo
+
+from Clients.path_index import get_path_index
+from Clients.read_only_git_client import ReadOnlyGitClient
+
+
+def git(cwd, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=cwd, check=True,
+                   capture_output=True)
+
+
+def push_files(work_dir, files: dict, message: str):
+    for path, content in files.items():
+        target = work_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding="utf-8")
+    git(work_dir, "add", "-A")
+    git(work_dir, "commit", "-q", "-m", message)
+    git(work_dir, "push", "-q", "origin", "HEAD:main")
+
+
+def test_path_index_of_a_bare_repo_follows_new_commits(tmp_path):
+    bare_dir, work_dir = tmp_path / "repo.git", tmp_path / "work"
+    git(tmp_path, "init", "-q", "--bare", "--initial-branch=main", str(bare_dir))
+    git(tmp_path, "clone", "-q", str(bare_dir), str(work_dir))
+    push_files(work_dir, {"README.md": "readme\n", "src/app.py": "app\n", "src/lib/util.py": "util\n"}, "first")
+
+    repo = Repo(bare_dir)
+    client = ReadOnlyGitClient.from_repo(repo)
+    first = get_path_index(repo)
+    assert client.get_tree() == ["README.md", "src/app.py", "src/lib/util.py"]
+    assert client.list_directory("src") == {"app.py": 1, "lib/": 1}
+    assert client.search_files(r"util") == ["src/lib/util.py"]
+    assert client.search_files("src/**/*.py", glob=True) == ["src/lib/util.py"]
+    assert first.blob_sha("src/app.py") == repo.head.commit.tree["src/app.py"].hexsha
+    assert os.path.exists(os.path.join(repo.git_dir, "agent-cache", "paths", f"{first.tree_sha}.json"))
+
+    push_files(work_dir, {"src/new.py": "new\n"}, "second")
+    assert client.get_tree() == ["README.md", "src/app.py", "src/lib/util.py", "src/new.py"]
+    assert client.list_directory("src") == {"app.py": 1, "lib/": 1, "new.py": 1}
+    # The index of the older commit is still served
+    assert client.get_tree("HEAD~1") == first.paths
+    assert get_path_index(repo, "HEAD~1") is first
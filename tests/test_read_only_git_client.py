@@ -0,0 +1,45 @@
+import subprocess
+
+import pytest
+from git import Repo
+
+from Clients.read_only_git_client import ReadOnlyGitClient
+
+SPECIAL_PATHS = ["plain.txt", "with space.txt", "café.txt", 'quo"te.txt', "dir/tab\there.txt"]
+
+
+def commit_files(repo_dir, files: dict, message: str):
+    for path, content in files.items():
+        target = repo_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding="utf-8")
+    subprocess.run(["git", "add", "-A"], cwd=repo_dir, check=True)
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", message],
+                   cwd=repo_dir, check=True)
+
+
+@pytest.fixture
+def client(tmp_path):
+    repo_dir = tmp_path / "work"
+    Repo.init(repo_dir)
+    commit_files(repo_dir, {path: "one\n" for path in SPECIAL_PATHS}, "first")
+    commit_files(repo_dir, {path: "one\ntwo\n" for path in SPECIAL_PATHS}, "second")
+    return ReadOnlyGitClient.from_repo(Repo(repo_dir))
+
+
+def test_diff_paths_are_unquoted(client):
+    files = dict(client.iter_file_diffs("HEAD~1", "HEAD"))
+    assert sorted(files) == sorted(SPECIAL_PATHS)
+    assert "+two" in files["café.txt"]
+    assert [stat["path"] for stat in client.get_diffstat("HEAD~1", "HEAD")] == list(files)
+
+
+def test_grep_skips_big_blobs_beyond_the_excluded_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr("Clients.read_only_git_client.MAX_GREP_EXCLUDES", 1)
+    repo_dir = tmp_path / "work"
+    Repo.init(repo_dir)
+    commit_files(repo_dir, {"small.txt": "needle\n", "big1.txt": "needle\n" * 10, "big2.txt": "needle\n" * 20,
+                            "café big.txt": "needle\n" * 30}, "first")
+    client = ReadOnlyGitClient.from_repo(Repo(repo_dir))
+    assert [match["path"] for match in client.grep("needle", max_blob_bytes=20)] == ["small.txt"]
+    assert {match["path"] for match in client.grep("needle")} == {"small.txt", "big1.txt", "big2.txt", "café big.txt"}